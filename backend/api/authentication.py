@@ -0,0 +1,127 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+AUTH_TOKEN_CACHE_TTL = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 30)
+AUTH_TOKEN_CACHE_SIZE = getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000)
+AUTH_TOKEN_SHARED_CACHE = getattr(settings, 'AUTH_TOKEN_SHARED_CACHE', False)
+AUTH_TOKEN_SHARED_CACHE_TIMEOUT = getattr(
+    settings, 'AUTH_TOKEN_SHARED_CACHE_TIMEOUT', 300)
+# Поля пользователя в общем кеше: хеш пароля и счетчики
+# туда не попадают и при обращении читаются из базы.
+AUTH_TOKEN_USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser')
+
+
+def token_cache_key(key):
+    return 'auth_token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    LRU-кеш токенов с пользователями в памяти процесса
+    с ограниченным временем жизни записей.
+    """
+
+    def __init__(self, ttl=AUTH_TOKEN_CACHE_TTL, size=AUTH_TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, token = item
+            if expires <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, token)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+token_cache = TokenCache()
+
+
+def invalidate_token(key):
+    """
+    Сбрасывает токен из кеша процесса и общего кеша.
+    Другие процессы увидят изменение не позже чем
+    через AUTH_TOKEN_CACHE_TTL секунд.
+    """
+    token_cache.delete(key)
+    if AUTH_TOKEN_SHARED_CACHE:
+        cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе данных
+    на каждый запрос: токен с пользователем берется из кеша
+    процесса, затем из общего кеша, если он включен
+    настройкой AUTH_TOKEN_SHARED_CACHE. В общий кеш
+    пишутся только ключ токена и AUTH_TOKEN_USER_FIELDS.
+    """
+
+    def dump_token(self, token):
+        return token.key, {
+            field: getattr(token.user, field)
+            for field in AUTH_TOKEN_USER_FIELDS}
+
+    def load_token(self, data):
+        """
+        Токен из записи общего кеша. Пользователь создается
+        как загруженный из базы с отложенными остальными
+        полями: они читаются при первом обращении.
+        """
+        key, values = data
+        user_model = get_user_model()
+        # from_db ждет значения в порядке полей модели.
+        fields = [
+            field.attname for field in user_model._meta.concrete_fields
+            if field.attname in values]
+        user = user_model.from_db(
+            user_model.objects.db, fields,
+            [values[field] for field in fields])
+        return self.get_model()(key=key, user=user)
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None and AUTH_TOKEN_SHARED_CACHE:
+            data = cache.get(token_cache_key(key))
+            if data is not None:
+                token = self.load_token(data)
+                token_cache.set(key, token)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+            if AUTH_TOKEN_SHARED_CACHE:
+                cache.set(
+                    token_cache_key(key), self.dump_token(token),
+                    AUTH_TOKEN_SHARED_CACHE_TIMEOUT)
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return copy.copy(token.user), token
@@ -0,0 +1,210 @@
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from foodgram.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+RECIPE_CACHE_TIMEOUT = getattr(settings, 'RECIPE_CACHE_TIMEOUT', 0)
+
+# Кеши, которые не видны другим процессам.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+CATALOG_VERSION = 'recipe_cache:catalog'
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe_cache:recipe:{recipe_id}'
+
+
+def author_version_key(author_id):
+    return f'recipe_cache:author:{author_id}'
+
+
+def user_version_key(user_id):
+    return f'recipe_cache:user:{user_id}'
+
+
+def set_version(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def bump_version(key):
+    """
+    Меняет версию после фиксации транзакции: записи,
+    построенные по старой версии, больше не читаются.
+    """
+    transaction.on_commit(partial(set_version, key))
+
+
+def check_shared_cache():
+    """
+    Версии и тела рецептов должны быть общими для всех
+    воркеров: в кеше процесса изменение, сделанное
+    в одном воркере, не видно остальным. В отладке
+    и тестах работает один процесс, и кеш процесса
+    допустим.
+    """
+    if settings.DEBUG or getattr(settings, 'TESTING', False):
+        return
+    if RECIPE_CACHE_TIMEOUT and isinstance(
+            caches['default'], PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            'Кеш рецептов (RECIPE_CACHE_TIMEOUT) требует общего для '
+            'воркеров CACHE_BACKEND, например memcached или Redis; '
+            'с кешем процесса отключите его: RECIPE_CACHE_TIMEOUT=0')
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    for key, value in missing.items():
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        versions[key] = value
+    return versions
+
+
+class CacheStats:
+    """
+    Счетчики попаданий и промахов кеша в процессе
+    с его запуска; сотрудникам отдаются в заголовке
+    X-Recipe-Cache-Totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def header(self):
+        with self._lock:
+            return f'hits={self.hits}; misses={self.misses}'
+
+
+cache_stats = CacheStats()
+
+
+class RecipeCache:
+    """
+    Кеш выдачи рецептов из двух частей: общее для всех
+    тело рецепта (тэги, автор, ингредиенты) по версии
+    рецепта и автора и персональные отметки пользователя
+    (избранное, корзина, подписки) по версии пользователя.
+    """
+
+    def __init__(self, request, load_recipes):
+        self.request = request
+        self.load_recipes = load_recipes
+        self.hits = 0
+        self.misses = 0
+
+    def get_keys(self, recipes):
+        """
+        Ключи тел рецептов и отметок пользователя для списка
+        пар (id рецепта, id автора). Все версии читаются
+        одним запросом к кешу.
+        """
+        author_ids = dict(recipes)
+        user = self.request.user
+        user_key = None if user.is_anonymous else user_version_key(user.id)
+        versions = get_versions([
+            CATALOG_VERSION,
+            *(recipe_version_key(pk) for pk in author_ids),
+            *(author_version_key(pk) for pk in set(author_ids.values())),
+            *([user_key] if user_key else []),
+        ])
+        origin = f'{self.request.scheme}://{self.request.get_host()}'
+        body_keys = {
+            pk: 'recipe_cache:body:{}:{}:{}:{}:{}'.format(
+                pk, origin, versions[CATALOG_VERSION],
+                versions[recipe_version_key(pk)],
+                versions[author_version_key(author_id)])
+            for pk, author_id in author_ids.items()
+        }
+        overlay_key = user_key and 'recipe_cache:overlay:{}:{}'.format(
+            user.id, versions[user_key])
+        return body_keys, overlay_key
+
+    @staticmethod
+    def get_etag(recipes, keys):
+        """
+        ETag по тем же версиям, что и ключи кеша:
+        он меняется вместе с отдаваемым телом, а для
+        проверки не нужно читать сами тела.
+        """
+        body_keys, overlay_key = keys
+        return ';'.join(
+            [body_keys[pk] for pk, author_id in recipes]
+            + [str(overlay_key)])
+
+    def get_bodies(self, body_keys):
+        cached = cache.get_many(body_keys.values())
+        bodies = {
+            pk: cached[key] for pk, key in body_keys.items() if key in cached}
+        missing = [pk for pk in body_keys if pk not in bodies]
+        if missing:
+            loaded = {body['id']: body for body in self.load_recipes(missing)}
+            cache.set_many(
+                {body_keys[pk]: body for pk, body in loaded.items()},
+                RECIPE_CACHE_TIMEOUT)
+            bodies.update(loaded)
+        self.hits += len(body_keys) - len(missing)
+        self.misses += len(missing)
+        return bodies
+
+    def get_overlay(self, overlay_key):
+        if overlay_key is None:
+            return set(), set(), set()
+        overlay = cache.get(overlay_key)
+        if overlay is not None:
+            self.hits += 1
+            return overlay
+        self.misses += 1
+        user = self.request.user
+        overlay = (
+            set(Favorite.objects.filter(
+                user=user).values_list('recipe_id', flat=True)),
+            set(ShoppingCart.objects.filter(
+                user=user).values_list('recipe_id', flat=True)),
+            set(Subscribe.objects.filter(
+                user=user).values_list('author_id', flat=True)),
+        )
+        cache.set(overlay_key, overlay, RECIPE_CACHE_TIMEOUT)
+        return overlay
+
+    def get_many(self, recipes, keys=None):
+        """
+        Собирает выдачу для списка пар (id рецепта, id автора)
+        в исходном порядке по ключам из get_keys.
+        """
+        body_keys, overlay_key = keys or self.get_keys(recipes)
+        bodies = self.get_bodies(body_keys)
+        favorites, shopping_cart, subscriptions = self.get_overlay(
+            overlay_key)
+        cache_stats.add(self.hits, self.misses)
+        result = []
+        for pk, author_id in recipes:
+            if pk not in bodies:
+                continue
+            data = bodies[pk].copy()
+            data['author'] = dict(
+                data['author'], is_subscribed=author_id in subscriptions)
+            data['is_favorited'] = pk in favorites
+            data['is_in_shopping_cart'] = pk in shopping_cart
+            result.append(data)
+        return result
+
+    def header(self):
+        return f'hits={self.hits}; misses={self.misses}'
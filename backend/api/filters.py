@@ -1,5 +1,10 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
 from django_filters import rest_framework as filters
-from foodgram.models import Ingredient, Recipe
+from foodgram.models import (SEARCH_CONFIG, Favorite, Ingredient, Recipe,
+                             ShoppingCart, Tag)
+from rest_framework.filters import SearchFilter
 
 
 class IngredientFilter(filters.FilterSet):
@@ -15,13 +20,32 @@ class IngredientFilter(filters.FilterSet):
         fields = ('name',)
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """
+    Сортировка с добавлением id, чтобы рецепты
+    с равными счетчиками не менялись местами
+    между страницами.
+    """
+
+    def filter(self, queryset, value):
+        queryset = super().filter(queryset, value)
+        if value:
+            queryset = queryset.order_by(*queryset.query.order_by, '-id')
+        return queryset
+
+
 class RecipeFilter(filters.FilterSet):
     """
     Класс для фильтрации списка
     рецептов по тэгам, нахождению
     в корзине и избранных рецептах.
     """
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    ordering = RecipeOrderingFilter(
+        fields=('pub_date', 'favorites_count', 'in_carts_count'))
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all())
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='is_in_shopping_cart',
         method='filter_is_in_shopping_cart')
@@ -29,18 +53,49 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_favorited',
         method='filter_is_favorited')
 
+    def filter_user_recipes(self, queryset, model, value):
+        """
+        Отбор через подзапрос по id, а не по аннотациям
+        Exists: так условие не вычисляется для каждой строки
+        выборки, в том числе в COUNT(*) пагинатора.
+        """
+        if not value:
+            return queryset
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(id__in=model.objects.filter(
+            user=user).values('recipe_id'))
+
     def filter_is_favorited(self, queryset, name, value):
-        if name == 'is_favorited' and value:
-            queryset = queryset.filter(
-                favorite_recipe__user=self.request.user)
-        return queryset
+        return self.filter_user_recipes(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if name == 'is_in_shopping_cart' and value:
-            queryset = queryset.filter(
-                shopping_cart_recipe__user=self.request.user)
-        return queryset
+        return self.filter_user_recipes(queryset, ShoppingCart, value)
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',)
+
+
+class RecipeSearchFilter(SearchFilter):
+    """
+    Полнотекстовый поиск рецептов по названию
+    и описанию с ранжированием по релевантности.
+    На базах, отличных от PostgreSQL, выполняется
+    простой поиск по вхождению подстроки.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            for term in search_terms:
+                queryset = queryset.filter(
+                    Q(name__icontains=term) | Q(text__icontains=term))
+            return queryset
+        query = SearchQuery(' '.join(search_terms), config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-id')
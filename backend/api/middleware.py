@@ -0,0 +1,114 @@
+import logging
+import re
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+DB_INSTRUMENTATION = getattr(settings, 'DB_INSTRUMENTATION', True)
+DB_SLOW_REQUEST_QUERIES = getattr(settings, 'DB_SLOW_REQUEST_QUERIES', 50)
+DB_SLOW_REQUEST_TIME = getattr(settings, 'DB_SLOW_REQUEST_TIME', 0.5)
+DB_REPEATED_QUERY_THRESHOLD = getattr(
+    settings, 'DB_REPEATED_QUERY_THRESHOLD', 5)
+DB_REPORT_TOP = 5
+
+logger = logging.getLogger('api.db')
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def fingerprint(sql):
+    """
+    Форма запроса: списки IN любой длины приводятся
+    к одному виду, параметры уже вынесены драйвером.
+    """
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+class QueryStats:
+    """
+    Обертка execute_wrapper: считает запросы и время
+    их выполнения, группируя по тексту SQL.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+        self.statement_time = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            self.statements[sql] += 1
+            self.statement_time[sql] += elapsed
+
+    def shapes(self):
+        """
+        Формы запросов по убыванию числа повторов:
+        (форма, число выполнений, суммарное время).
+        """
+        counts, times = Counter(), defaultdict(float)
+        for sql, count in self.statements.items():
+            shape = fingerprint(sql)
+            counts[shape] += count
+            times[shape] += self.statement_time[sql]
+        return [
+            (shape, count, times[shape])
+            for shape, count in counts.most_common()
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает запросы к базе данных и их время для каждого
+    запроса без DEBUG. Запросы сверх порогов и запросы
+    с повторяющимся SQL (признак N+1) пишутся в лог api.db,
+    сотрудникам отдаются заголовки X-DB-Queries и X-DB-Time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not DB_INSTRUMENTATION:
+            return self.get_response(request)
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['X-DB-Queries'] = stats.count
+            response['X-DB-Time'] = f'{stats.time * 1000:.1f}ms'
+        # Повторы считаются по формам запросов, как и в отчете:
+        # N+1 со списками IN разной длины дает разный текст SQL.
+        shapes = stats.shapes()
+        if (stats.count >= DB_SLOW_REQUEST_QUERIES
+                or stats.time >= DB_SLOW_REQUEST_TIME
+                or shapes and shapes[0][1] >= DB_REPEATED_QUERY_THRESHOLD):
+            self.report(request, stats, shapes)
+        return response
+
+    def report(self, request, stats, shapes):
+        repeated = sum(
+            count >= DB_REPEATED_QUERY_THRESHOLD
+            for shape, count, elapsed in shapes)
+        lines = [
+            f'{count} x {elapsed * 1000:.1f}ms'
+            f'{" [N+1]" if count >= DB_REPEATED_QUERY_THRESHOLD else ""}: '
+            f'{shape[:300]}'
+            for shape, count, elapsed in shapes[:DB_REPORT_TOP]
+        ]
+        logger.warning(
+            '%s %s: %d queries, %.1fms, repeated shapes: %d\n%s',
+            request.method, request.get_full_path(), stats.count,
+            stats.time * 1000, repeated, '\n'.join(lines))
@@ -0,0 +1,67 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from foodgram.models import TableVersion
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов. Метод get_validators
+    возвращает ETag и время изменения, вычисленные
+    без сериализации ответа; при совпадении
+    с If-None-Match / If-Modified-Since отдается 304.
+    """
+
+    def get_validators(self, request):
+        raise NotImplementedError
+
+    @staticmethod
+    def make_etag(value):
+        return quote_etag(hashlib.md5(value.encode()).hexdigest())
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        etag = self.make_etag(etag)
+        timestamp = (
+            int(last_modified.timestamp())
+            if last_modified is not None else None)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class TableVersionMixin(ConditionalGetMixin):
+    """
+    Валидаторы по версии таблицы справочника:
+    проверка стоит одного запроса по уникальному индексу.
+    """
+
+    def get_table_version(self):
+        """
+        Версия таблицы читается один раз за запрос.
+        """
+        if not hasattr(self, '_table_version'):
+            self._table_version = TableVersion.objects.get_version(
+                self.get_queryset().model._meta.db_table)
+        return self._table_version
+
+    def get_validators(self, request):
+        table = self.get_queryset().model._meta.db_table
+        version, updated_at = self.get_table_version()
+        return (f'{table}-{version}-{request.get_full_path()}', updated_at)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
@@ -1,6 +1,132 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+APPROXIMATE_COUNT_TIMEOUT = 60
+
+
+def get_approximate_count(queryset):
+    """
+    Возвращает примерное число строк выборки.
+    На PostgreSQL берется оценка планировщика из
+    EXPLAIN без выполнения запроса, на прочих базах —
+    обычный COUNT. Результат кешируется.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'approximate_count:' + hashlib.md5(
+        f'{sql}{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is not None:
+        return count
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        count = int(plan[0]['Plan']['Plan Rows'])
+    else:
+        count = queryset.values('pk').count()
+    cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+    return count
+
+
+class CountPaginator(Paginator):
+    """
+    COUNT(*) считается по выборке из одних id, поэтому
+    подзапросы Exists и прочие аннотации, нужные только
+    строкам страницы, в подсчете не выполняются.
+    """
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return self.object_list.values('pk').count()
+        return len(self.object_list)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору без COUNT(*).
+    Общее число записей оценивается приблизительно
+    и только по запросу ?with_count=1.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get('with_count') in BooleanField.TRUE_VALUES:
+            self.count = get_approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+
+class SubscribeKeysetPagination(KeysetPagination):
+    ordering = ('-id',)
 
 
 class PagePagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы.
+    С параметром ?pagination=cursor выдача
+    переключается на курсорную, если она
+    задана в cursor_pagination_class. Курсор
+    задает свой порядок, поэтому вместе с ним
+    параметры сортировки и поиска отклоняются.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = CountPaginator
+    cursor_pagination_class = None
+    cursor_conflicting_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (self.cursor_pagination_class is not None
+                and request.query_params.get('pagination') == 'cursor'):
+            conflicting = [
+                param for param in self.cursor_conflicting_params
+                if request.query_params.get(param)]
+            if conflicting:
+                raise ValidationError({
+                    param: 'Не поддерживается с pagination=cursor.'
+                    for param in conflicting})
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(PagePagination):
+    cursor_pagination_class = KeysetPagination
+
+
+class SubscribePagination(PagePagination):
+    cursor_pagination_class = SubscribeKeysetPagination
@@ -0,0 +1,13 @@
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Тело запроса в NDJSON отдается итератором строк
+    и читается по мере обработки, не загружаясь
+    в память целиком.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream)
@@ -0,0 +1,49 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Сам список покупок отдается потоком в обход рендерера,
+    сюда попадают ответы с ошибками (401, 404 и другие):
+    текст из detail или JSON для прочих данных.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or isinstance(data, (str, bytes)):
+            return data
+        if isinstance(data, dict) and set(data) == {'detail'}:
+            return f'{data["detail"]}\n'.encode(self.charset)
+        return JSONRenderer().render(data)
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    """
+    Выгрузка списка покупок в виде текста.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class ShoppingCartCsvRenderer(ShoppingCartRenderer):
+    """
+    Выгрузка списка покупок в формате CSV.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class FileDownloadNegotiation(DefaultContentNegotiation):
+    """
+    Формат файла выбирается параметром ?format,
+    а при несовпадении заголовка Accept отдается
+    первый из доступных форматов.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return (renderers[0], renderers[0].media_type)
@@ -0,0 +1,73 @@
+import os
+
+from django.conf import settings
+from django.conf.urls import url
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from rest_framework import permissions
+from rest_framework.request import Request
+
+API_SCHEMA_FILE = getattr(settings, 'API_SCHEMA_FILE', os.path.join(
+    os.path.dirname(__file__), 'static', 'api', 'swagger.json'))
+API_DOCS_CACHE_TIMEOUT = getattr(settings, 'API_DOCS_CACHE_TIMEOUT', 0)
+
+
+def get_schema_info():
+    """
+    drf_yasg импортируется только здесь и в функциях ниже:
+    он нужен для генерации схемы и интерактивной документации,
+    а воркерам без API_DOCS только замедляет запуск.
+    """
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title='Foodgram API',
+        default_version='v1/',
+        description='Документация для проекта Foodgram',
+        contact=openapi.Contact(email='admin@foodgram.ru'),
+        license=openapi.License(name='BSD License'),
+    )
+
+
+def generate_schema():
+    """
+    Схема API в JSON в том виде, в каком ее отдает
+    /api/swagger.json.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    # Представлениям нужен запрос анонимного пользователя,
+    # пустой url убирает из схемы хост, на котором ее собрали.
+    request = Request(RequestFactory().get('/api/swagger.json'))
+    request.user = AnonymousUser()
+    schema = OpenAPISchemaGenerator(get_schema_info(), url='').get_schema(
+        request, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+
+def get_docs_urlpatterns():
+    """
+    Схема и интерфейсы Swagger и ReDoc, собираемые из кода
+    на лету. Подключаются только при API_DOCS.
+    """
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        get_schema_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return [
+        url(r'^swagger(?P<format>\.yaml)$',
+            schema_view.without_ui(cache_timeout=API_DOCS_CACHE_TIMEOUT),
+            name='schema-yaml'),
+        url(r'^swagger/$',
+            schema_view.with_ui(
+                'swagger', cache_timeout=API_DOCS_CACHE_TIMEOUT),
+            name='schema-swagger-ui'),
+        url(r'^redoc/$',
+            schema_view.with_ui(
+                'redoc', cache_timeout=API_DOCS_CACHE_TIMEOUT),
+            name='schema-redoc'),
+    ]
@@ -1,10 +1,20 @@
+from functools import partial
+
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
+from foodgram.images import (delete_image_variants, get_srcset,
+                             schedule_image_variants)
 from foodgram.models import (Favorite, Ingredient, IngredientInRecipe,
-                             Recipe, ShoppingCart, Tag)
+                             Recipe, ShoppingCart, ShoppingListItem, Tag)
 from users.models import Subscribe, User
 
+from .utils import get_recipes_limit
+
+BULK_RECIPES_LIMIT = getattr(settings, 'BULK_RECIPES_LIMIT', 100)
+
 
 class CustomUserSerializer(serializers.ModelSerializer):
     """
@@ -18,6 +28,8 @@ class CustomUserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if self.context.get('request').user.is_anonymous:
             return False
@@ -62,24 +74,41 @@ class SubscribeSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_is_subscribed(self, obj):
-        return Subscribe.objects.filter(
-            user=obj.user,
-            author=obj.author
-        ).exists()
+        return True
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(
-            author=obj.author
-        ).count()
+        return obj.author.recipes_count
 
     def get_recipes(self, obj):
-        queryset = (
-            Recipe.objects.filter(
-                author=obj.author).order_by('-pub_date'))
+        if hasattr(obj.author, 'recipes_preview'):
+            queryset = obj.author.recipes_preview
+        else:
+            queryset = (
+                Recipe.objects.filter(
+                    author=obj.author).order_by('-pub_date'))
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                queryset = queryset[:recipes_limit]
         return SubscribeRecipeSerializer(queryset, many=True).data
 
 
-class SubscribeRecipeSerializer(serializers.ModelSerializer):
+class SrcsetMixin(serializers.Serializer):
+    """
+    Добавляет поле srcset с уменьшенными
+    копиями картинки рецепта.
+    """
+    srcset = serializers.SerializerMethodField()
+
+    def get_srcset(self, obj):
+        if not obj.image or not obj.image_variants_ready:
+            return None
+        request = self.context.get('request')
+        return get_srcset(
+            obj.image.name,
+            request.build_absolute_uri if request else None)
+
+
+class SubscribeRecipeSerializer(SrcsetMixin, serializers.ModelSerializer):
     """
     Сериализатор полей избранных рецептов.
     """
@@ -87,15 +116,14 @@ class SubscribeRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'srcset', 'cooking_time')
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор связи ингредиентов и рецептов.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -106,7 +134,16 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class IngredientAmountSerializer(serializers.Serializer):
+    """
+    Сериализатор ингредиента и его количества
+    при создании и изменении рецепта.
+    """
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField()
+
+
+class RecipeReadSerializer(SrcsetMixin, serializers.ModelSerializer):
     """
     Сериализатор просмотра рецептов.
     """
@@ -121,10 +158,12 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
+                  'is_in_shopping_cart', 'name', 'image', 'srcset',
                   'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -134,6 +173,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -148,10 +189,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     Сериализатор создания рецептов.
     """
     author = CustomUserSerializer(read_only=True, required=False)
-    ingredients = IngredientInRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all())
+    ingredients = IngredientAmountSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(max_length=None, use_url=True)
 
     class Meta:
@@ -160,20 +199,29 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                   'image', 'text', 'cooking_time',)
 
     def validate_ingredients(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        if not ingredients:
+        """
+        Все ингредиенты проверяются одним запросом, найденные
+        объекты возвращаются для записи в create_ingredients.
+        """
+        if not data:
             raise serializers.ValidationError(
                 detail='Отсутствуют ингредиенты')
-        for ingredient in ingredients:
-            if int(ingredient.get('amount')) <= 0:
-                raise serializers.ValidationError(
-                    detail='Минимум один ингредиент')
-            id_check = ingredient['id']
-            ingr_check = Ingredient.objects.filter(id=id_check)
-            if not ingr_check.exists():
-                raise serializers.ValidationError(
-                    detail='Данный ингредиент отсутствует в базе данных')
-        return data
+        ingredient_ids = [ingredient['id'] for ingredient in data]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                detail='Ингредиенты в рецепте не должны повторяться')
+        if any(ingredient['amount'] <= 0 for ingredient in data):
+            raise serializers.ValidationError(
+                detail='Минимум один ингредиент')
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        if len(ingredients) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                detail='Данный ингредиент отсутствует в базе данных')
+        return [
+            {'ingredient': ingredients[ingredient['id']],
+             'amount': ingredient['amount']}
+            for ingredient in data
+        ]
 
     def validate_cooking_time(self, data):
         cooking_time = self.initial_data.get('cooking_time')
@@ -183,27 +231,25 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return data
 
     def validate_tags(self, data):
-        tags = self.initial_data.get('tags')
-        if not tags:
+        if not data:
             raise serializers.ValidationError(
                 detail='Отсутствует тэг')
-        for tag in tags:
-            if not Tag.objects.filter(id=tag).exists():
-                raise serializers.ValidationError(
-                    detail='Указанный тэг отсутствует в базе данных')
-        return data
+        tag_ids = list(dict.fromkeys(data))
+        tags = Tag.objects.in_bulk(tag_ids)
+        if len(tags) != len(tag_ids):
+            raise serializers.ValidationError(
+                detail='Указанный тэг отсутствует в базе данных')
+        return [tags[tag_id] for tag_id in tag_ids]
 
     def create_ingredients(self, ingredients, recipe):
-        list_ingredient = []
-        for ingredient_data in ingredients:
-            list_ingredient.append(
-                IngredientInRecipe(
-                    ingredient=ingredient_data.pop('id'),
-                    amount=ingredient_data.pop('amount'),
-                    recipe=recipe,
-                )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                ingredient=ingredient_data['ingredient'],
+                amount=ingredient_data['amount'],
+                recipe=recipe,
             )
-        IngredientInRecipe.objects.bulk_create(list_ingredient)
+            for ingredient_data in ingredients
+        )
 
     @transaction.atomic
     def create(self, validated_data):
@@ -212,20 +258,73 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        if recipe.image:
+            transaction.on_commit(
+                partial(schedule_image_variants, recipe.id))
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Сравнивает новый состав рецепта с текущим и меняет
+        только отличающиеся строки. Удаление строк обновляет
+        списки покупок сигналами, а для массовых изменений
+        возвращаются изменения количества по ингредиентам.
+        """
+        current = {row.ingredient_id: row
+                   for row in recipe.ingredientrecipe.all()}
+        old_amounts = {ingredient_id: row.amount
+                       for ingredient_id, row in current.items()}
+        new_amounts = {ingredient['ingredient'].id: ingredient['amount']
+                       for ingredient in ingredients}
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            row = current.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [row.id for ingredient_id, row in current.items()
+                     if ingredient_id not in new_amounts]
+        to_create = [ingredient for ingredient in ingredients
+                     if ingredient['ingredient'].id not in current]
+        if to_delete:
+            IngredientInRecipe.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientInRecipe.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            self.create_ingredients(to_create, recipe)
+        return {
+            ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+            for ingredient_id, amount in new_amounts.items()
+        }
+
     @transaction.atomic
     def update(self, recipe, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            deltas = self.update_ingredients(
+                recipe, validated_data.pop('ingredients'))
+            ShoppingListItem.objects.apply_deltas(
+                ShoppingCart.objects.filter(
+                    recipe=recipe).values_list('user_id', flat=True),
+                deltas)
         if 'tags' in validated_data:
             tags_data = validated_data.pop('tags')
             recipe.tags.set(tags_data)
+        if validated_data.get('image'):
+            recipe.image_variants_ready = False
+            transaction.on_commit(
+                partial(delete_image_variants, recipe.image.name))
+            transaction.on_commit(
+                partial(schedule_image_variants, recipe.id))
         return super().update(recipe, validated_data)
 
     def to_representation(self, recipe):
+        prefetch_related_objects(
+            [recipe],
+            'tags',
+            Prefetch(
+                'ingredientrecipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient')))
         serializer = RecipeReadSerializer(
             recipe,
             context=self.context)
@@ -273,3 +372,17 @@ class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Сериализатор списка рецептов для массового
+    добавления в избранное и корзину и удаления из них.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT)
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe, User
+
+from .authentication import invalidate_token
+from .cache import (CATALOG_VERSION, author_version_key, bump_version,
+                    recipe_version_key, user_version_key)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_version(recipe_version_key(instance.id))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    bump_version(recipe_version_key(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_version(recipe_version_key(instance.id))
+    elif pk_set:
+        for recipe_id in pk_set:
+            bump_version(recipe_version_key(recipe_id))
+    else:
+        bump_version(CATALOG_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    bump_version(CATALOG_VERSION)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_author(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(author_version_key(instance.id))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_user(sender, instance, **kwargs):
+    bump_version(user_version_key(instance.user_id))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_auth_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_token, instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None,
+                           **kwargs):
+    """
+    Выход через token_destroy удаляет токен, а изменение
+    пользователя, в том числе деактивация, сбрасывает
+    его токены из кеша аутентификации.
+    """
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    for key in Token.objects.filter(
+            user=instance).values_list('key', flat=True):
+        transaction.on_commit(partial(invalidate_token, key))
@@ -0,0 +1,610 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from foodgram.ingredient_index import ingredient_index
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, ShoppingListItem, TableVersion,
+                             Tag)
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from users.models import Subscribe, User
+
+from .authentication import token_cache, token_cache_key
+from .cache import check_shared_cache
+from .filters import RecipeSearchFilter
+from .middleware import (DB_REPEATED_QUERY_THRESHOLD,
+                         QueryInstrumentationMiddleware)
+from .views import RecipeViewSet
+
+
+class RecipeTestCase(TestCase):
+    """
+    Читатель, автор и рецепты с тэгом и ингредиентами
+    в избранном и корзине читателя.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Иван', last_name='Иванов', password='Pass12345!')
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10)
+            recipe.tags.add(self.tag)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=100)
+                for ingredient in self.ingredients)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+
+class RecipeListQueriesTest(RecipeTestCase):
+    """
+    Число запросов списка рецептов не зависит
+    от числа рецептов, а COUNT(*) пагинатора не
+    вычисляет отметки пользователя для каждой строки.
+    """
+
+    def get_list(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_queries_do_not_depend_on_recipes_count(self):
+        self.create_recipes(2)
+        response, few = self.get_list('/api/recipes/?limit=10')
+        self.assertEqual(len(response.data['results']), 2)
+        self.create_recipes(8)
+        response, many = self.get_list('/api/recipes/?limit=10')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertTrue(all(
+            recipe['is_favorited'] and recipe['is_in_shopping_cart']
+            for recipe in response.data['results']))
+        self.assertEqual(len(few), len(many))
+
+    def test_page_count_skips_user_flags(self):
+        self.create_recipes(3)
+        for url in ('/api/recipes/', '/api/recipes/?is_favorited=1'):
+            response, queries = self.get_list(url)
+            self.assertEqual(response.data['count'], 3)
+            counts = [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT COUNT(*)')]
+            self.assertEqual(len(counts), 1, counts)
+            self.assertNotIn('EXISTS', counts[0].upper())
+
+    def test_detail_queries(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/'
+        for client, expected in ((APIClient(), 5), (self.client, 5)):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                len(response.data['ingredients']), len(self.ingredients))
+            self.assertEqual(
+                len(queries), expected,
+                [query['sql'] for query in queries.captured_queries])
+
+
+class RecipeConditionalGetTest(TestCase):
+    """
+    Повторная проверка выдачи рецептов стоит одного
+    запроса к версиям таблиц, а ETag меняется вместе
+    с рецептами и отметками пользователя.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name='Иван', last_name='Иванов', password='Pass12345!')
+            for name in ('reader', 'other'))
+        cls.recipe = Recipe.objects.create(
+            author=cls.other, name='Блины', text='Описание',
+            cooking_time=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, queries
+
+    def test_not_modified_reads_only_versions(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.id}/'):
+            etag = self.client.get(url)['ETag']
+            response, queries = self.revalidate(url, etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(queries), 1, queries.captured_queries)
+
+    def test_etag_follows_changes(self):
+        url = '/api/recipes/'
+        etag = self.client.get(url)['ETag']
+        Favorite.objects.create(user=self.other, recipe=self.recipe)
+        response, queries = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response, queries = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+        etag = response['ETag']
+        self.recipe.name = 'Оладьи'
+        self.recipe.save()
+        response, queries = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'Оладьи')
+
+    def test_non_numeric_id_is_not_found(self):
+        for url in ('/api/recipes/abc/', '/api/recipes/abc/similar/',
+                    '/api/recipes/abc/favorite/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_counter_ordering_has_no_etag(self):
+        response = self.client.get('/api/recipes/?ordering=-favorites_count')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ShoppingCartBulkTest(RecipeTestCase):
+    """
+    Массовое добавление и очистка корзины поддерживают
+    счетчики и список покупок так же, как одиночные.
+    """
+
+    def test_bulk_add_and_clear(self):
+        self.create_recipes(3)
+        ShoppingCart.objects.filter(user=self.user).delete()
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.user, ingredient=self.ingredients[0]).total, 300)
+        response = self.client.delete(
+            f'/api/recipes/{recipe_ids[0]}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.user, ingredient=self.ingredients[0]).total, 200)
+        response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertFalse(ShoppingListItem.objects.filter(
+            user=self.user).exists())
+        self.assertFalse(Recipe.objects.filter(
+            in_carts_count__gt=0).exists())
+
+    def test_bulk_statuses(self):
+        self.create_recipes(2)
+        Favorite.objects.filter(user=self.user).delete()
+        first, second = Recipe.objects.values_list('id', flat=True)
+        missing = first + second
+        url = '/api/recipes/favorite/'
+        Favorite.objects.create(user=self.user, recipe_id=first)
+        response = self.client.post(
+            url, {'recipes': [first, second, missing]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['exists', 'added', 'not_found'])
+        self.assertEqual(Recipe.objects.get(id=second).favorites_count, 1)
+        response = self.client.delete(
+            url, {'recipes': [second, missing]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['deleted', 'not_found'])
+        self.assertEqual(Recipe.objects.get(id=second).favorites_count, 0)
+        self.assertEqual(
+            list(Favorite.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)), [first])
+
+
+class ShoppingCartDownloadTest(RecipeTestCase):
+    """
+    Текст и CSV отдаются по одному адресу: у каждого
+    формата свой ETag, а ответы различаются по Accept.
+    """
+    url = '/api/recipes/download_shopping_cart/'
+
+    def test_formats_have_own_etags(self):
+        self.create_recipes(1)
+        etags = {}
+        for file_format, accept in (('txt', 'text/plain'),
+                                    ('csv', 'text/csv')):
+            response = self.client.get(self.url, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Accept', response['Vary'])
+            self.assertTrue(response['Content-Type'].startswith(accept))
+            etags[file_format] = response['ETag']
+            response = self.client.get(
+                self.url, HTTP_ACCEPT=accept,
+                HTTP_IF_NONE_MATCH=etags[file_format])
+            self.assertEqual(response.status_code, 304)
+            self.assertIn('Accept', response['Vary'])
+        self.assertNotEqual(etags['txt'], etags['csv'])
+        response = self.client.get(
+            self.url, HTTP_ACCEPT='text/csv', HTTP_IF_NONE_MATCH=etags['txt'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_error_is_rendered_as_text(self):
+        response = APIClient().get(self.url, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 401)
+        self.assertNotEqual(response.content.strip(), b'detail')
+
+
+class RecipeCursorPaginationTest(RecipeTestCase):
+    """
+    Курсорная выдача: ?with_count= разбирается как флаг,
+    сортировка и поиск вместе с курсором отклоняются.
+    """
+
+    def test_with_count_flag(self):
+        self.create_recipes(2)
+        for value, expected in (('1', True), ('true', True),
+                                ('0', False), ('false', False)):
+            with self.subTest(with_count=value):
+                response = self.client.get('/api/recipes/', {
+                    'pagination': 'cursor', 'with_count': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual('count' in response.data, expected)
+
+    def test_ordering_and_search_rejected(self):
+        for param, value in (('ordering', '-favorites_count'),
+                             ('search', 'рецепт')):
+            with self.subTest(param=param):
+                response = self.client.get('/api/recipes/', {
+                    'pagination': 'cursor', param: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.data)
+
+
+class IngredientSearchTest(TestCase):
+    """
+    Автодополнение ингредиентов: индекс перестраивается
+    по версии таблицы, а ?limit= ограничен.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'мука {number}', measurement_unit='г')
+            for number in range(5))
+        TableVersion.objects.bump(Ingredient._meta.db_table)
+
+    def setUp(self):
+        # Версии откатываются вместе с транзакцией теста
+        # и могут совпасть с версией индекса другого теста.
+        ingredient_index.invalidate()
+
+    def search(self, **params):
+        response = APIClient().get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_limit_is_clamped(self):
+        for limit, count in (('-5', 1), ('0', 1), ('2', 2), ('abc', 5)):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    len(self.search(name='мука', limit=limit).data), count)
+        with mock.patch('api.views.INGREDIENT_SEARCH_MAX', 3):
+            self.assertEqual(
+                len(self.search(name='мука', limit=100000).data), 3)
+
+    def test_index_follows_table_version(self):
+        etag = self.search(name='соль')['ETag']
+        # Изменение в другом процессе: без сигналов этого процесса.
+        Ingredient.objects.filter(name='мука 0').update(name='соль')
+        TableVersion.objects.bump(Ingredient._meta.db_table)
+        response = self.search(name='соль')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([item['name'] for item in response.data], ['соль'])
+
+
+class RecipeCacheTest(TransactionTestCase):
+    """
+    Кеш рецептов: попадания и промахи, сброс при изменении
+    рецептов, их состава и отметок пользователя, ответ 304
+    по неизменным ключам. Версии кеша меняются после
+    фиксации транзакции, поэтому тест транзакционный.
+    """
+
+    def setUp(self):
+        for target in ('api.cache.RECIPE_CACHE_TIMEOUT',
+                       'api.views.RECIPE_CACHE_TIMEOUT'):
+            patcher = mock.patch(target, 300)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Иван', last_name='Иванов', password='Pass12345!')
+        self.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10)
+            for number in range(2)]
+        for recipe in self.recipes:
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100)
+        self.user.is_staff = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def test_hits_and_misses(self):
+        response = self.get('/api/recipes/')
+        self.assertEqual(response['X-Recipe-Cache'], 'hits=0; misses=3')
+        response = self.get('/api/recipes/')
+        self.assertEqual(response['X-Recipe-Cache'], 'hits=3; misses=0')
+        self.assertIn('X-Recipe-Cache-Totals', response)
+
+    def test_headers_only_for_staff(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        for client in (client, APIClient()):
+            response = client.get('/api/recipes/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Recipe-Cache', response)
+            self.assertNotIn('X-Recipe-Cache-Totals', response)
+
+    def rename_recipe(self, recipe):
+        recipe.name = 'Блины'
+        recipe.save()
+
+    def change_amount(self, recipe):
+        row = IngredientInRecipe.objects.get(recipe=recipe)
+        row.amount = 250
+        row.save()
+
+    def test_invalidation(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.id}/'
+        changes = (
+            (self.rename_recipe,
+             lambda data: data['name'] == 'Блины'),
+            (self.change_amount,
+             lambda data: data['ingredients'][0]['amount'] == 250),
+            (lambda recipe: Favorite.objects.create(
+                user=self.user, recipe=recipe),
+             lambda data: data['is_favorited']),
+            (lambda recipe: ShoppingCart.objects.create(
+                user=self.user, recipe=recipe),
+             lambda data: data['is_in_shopping_cart']),
+            (lambda recipe: Subscribe.objects.create(
+                user=self.user, author=recipe.author),
+             lambda data: data['author']['is_subscribed']),
+        )
+        for number, (change, check) in enumerate(changes):
+            with self.subTest(change=number):
+                self.get(url)
+                self.assertEqual(
+                    self.get(url)['X-Recipe-Cache'], 'hits=2; misses=0')
+                change(recipe)
+                response = self.get(url)
+                self.assertEqual(
+                    response['X-Recipe-Cache'], 'hits=1; misses=1')
+                self.assertTrue(check(response.data), response.data)
+
+    def test_not_modified(self):
+        etag = self.get('/api/recipes/')['ETag']
+        response = self.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        response = self.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CachedTokenAuthenticationTest(TransactionTestCase):
+    """
+    Кешированный токен перестает действовать после выхода
+    и деактивации пользователя, а общий кеш не хранит
+    хеш пароля.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Иван', last_name='Иванов', password='Pass12345!')
+
+    def login(self):
+        response = APIClient().post('/api/auth/token/login/', {
+            'email': 'reader@foodgram.ru', 'password': 'Pass12345!'})
+        self.assertEqual(response.status_code, 200, response.data)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}')
+        return client, response.data['auth_token']
+
+    def test_logout_and_deactivation(self):
+        for shared in (False, True):
+            with self.subTest(shared=shared), mock.patch(
+                    'api.authentication.AUTH_TOKEN_SHARED_CACHE', shared):
+                client, key = self.login()
+                self.assertEqual(client.get('/api/users/me/').status_code, 200)
+                response = client.post('/api/auth/token/logout/')
+                self.assertEqual(response.status_code, 204)
+                self.assertEqual(client.get('/api/users/me/').status_code, 401)
+                client, key = self.login()
+                self.assertEqual(client.get('/api/users/me/').status_code, 200)
+                self.user.is_active = False
+                self.user.save()
+                self.assertEqual(client.get('/api/users/me/').status_code, 401)
+                self.user.is_active = True
+                self.user.save()
+
+    @mock.patch('api.authentication.AUTH_TOKEN_SHARED_CACHE', True)
+    def test_shared_cache_has_no_password(self):
+        client, key = self.login()
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        data = cache.get(token_cache_key(key))
+        self.assertNotIn(self.user.password, repr(data))
+        token_cache.delete(key)
+        response = client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], self.user.email)
+
+
+class QueryInstrumentationMiddlewareTest(TestCase):
+    """
+    Заголовки X-DB-* получают только сотрудники, а повторы
+    одной формы запроса пишутся в лог api.db.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.staff = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name='Иван', last_name='Иванов', password='Pass12345!',
+                is_staff=name == 'staff')
+            for name in ('reader', 'staff'))
+
+    def test_headers_only_for_staff(self):
+        for user, expected in ((None, False), (self.user, False),
+                               (self.staff, True)):
+            with self.subTest(user=user):
+                client = APIClient()
+                client.force_authenticate(user)
+                response = client.get('/api/tags/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.has_header('X-DB-Queries'), expected)
+                self.assertEqual(response.has_header('X-DB-Time'), expected)
+
+    def test_repeated_shapes_are_logged(self):
+        def get_response(request):
+            # Одна форма запроса с разной длиной списка IN.
+            for size in range(1, DB_REPEATED_QUERY_THRESHOLD + 1):
+                list(Recipe.objects.filter(id__in=range(size)))
+            return HttpResponse()
+
+        request = RequestFactory().get('/api/recipes/')
+        request.user = self.user
+        with self.assertLogs('api.db', 'WARNING') as logs:
+            QueryInstrumentationMiddleware(get_response)(request)
+        self.assertIn('[N+1]', logs.output[0])
+        self.assertIn('repeated shapes: 1', logs.output[0])
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """
+    Кеш рецептов не включается поверх кеша процесса
+    вне отладки и тестов.
+    """
+
+    @override_settings(TESTING=False)
+    def test_process_cache_is_rejected(self):
+        check_shared_cache()
+        with mock.patch('api.cache.RECIPE_CACHE_TIMEOUT', 300):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_cache()
+
+    def test_process_cache_is_allowed_in_tests(self):
+        with mock.patch('api.cache.RECIPE_CACHE_TIMEOUT', 300):
+            check_shared_cache()
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Индексы поиска есть только в PostgreSQL')
+class SearchIndexPlanTest(TestCase):
+    """
+    Поиск рецептов и ингредиентов использует GIN-индексы,
+    которые создает post_migrate, а выдача рецептов —
+    индексы порядка по дате и отметок пользователя.
+    На маленьких таблицах планировщик выбрал бы полный
+    просмотр, поэтому он отключается на время транзакции
+    теста.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Иван', last_name='Иванов', password='Pass12345!')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def explain_list(self, user, **params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None, kwargs={})
+        return view.filter_queryset(view.get_queryset())[:6].explain()
+
+    def test_recipe_list_uses_order_indexes(self):
+        for params, index in (
+                ({}, 'recipe_pub_date_idx'),
+                ({'author': self.user.id}, 'recipe_author_pub_date_idx')):
+            with self.subTest(params=params):
+                self.assertIn(
+                    index, self.explain_list(AnonymousUser(), **params))
+
+    def test_user_marks_use_unique_indexes(self):
+        for param, index in (('is_favorited', 'unique_favorite'),
+                             ('is_in_shopping_cart', 'unique_shopping_cart')):
+            with self.subTest(param=param):
+                self.assertIn(
+                    index, self.explain_list(self.user, **{param: 1}))
+
+    def test_recipe_search_uses_gin_index(self):
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', {'search': 'блины'}))
+        queryset = RecipeSearchFilter().filter_queryset(
+            request, Recipe.objects.all(), None)
+        self.assertIn(
+            'foodgram_recipe_search_vector_gin', queryset.explain())
+
+    def test_ingredient_search_uses_trigram_index(self):
+        for lookup in ('name__istartswith', 'name__icontains'):
+            queryset = Ingredient.objects.filter(**{lookup: 'мук'})
+            self.assertIn('foodgram_ingredient_name_trgm', queryset.explain())
@@ -1,10 +1,11 @@
-from django.conf.urls import url
+import os
+
+from django.conf import settings
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
+from django.views.static import serve
 from rest_framework.routers import DefaultRouter
 
+from .schema import API_SCHEMA_FILE, get_docs_urlpatterns
 from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
                     TagViewSet)
 
@@ -20,25 +21,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
+    path('swagger.json', serve, {
+        'path': os.path.basename(API_SCHEMA_FILE),
+        'document_root': os.path.dirname(API_SCHEMA_FILE),
+    }, name='schema-json'),
 ]
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Foodgram API",
-      default_version='v1/',
-      description="Документация для проекта Foodgram",
-      contact=openapi.Contact(email="admin@foodgram.ru"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
-urlpatterns += [
-   url(r'^swagger(?P<format>\.json|\.yaml)$',
-       schema_view.without_ui(cache_timeout=0), name='schema-json'),
-   url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0),
-       name='schema-swagger-ui'),
-   url(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0),
-       name='schema-redoc'),
-]
+if settings.API_DOCS:
+    urlpatterns += get_docs_urlpatterns()
@@ -1,14 +1,135 @@
-from django.http import HttpResponse
-
-
-def create_shopping_cart(ingredients):
-    shopping = 'Необходимо приобрести:'
-    shopping += '\n'.join([
-        f"{ingredient['ingredient__name']}-{ingredient['ingredient_total']}/"
-        f"{ingredient['ingredient__measurement_unit']}"
-        for ingredient in ingredients
-    ])
-    file = 'shopping.txt'
-    response = HttpResponse(shopping, content_type='text/plain')
+import csv
+import hashlib
+
+from django.http import StreamingHttpResponse
+from django.utils.http import quote_etag
+from foodgram.models import Ingredient, ShoppingListItem, TableVersion
+from rest_framework import serializers
+from users.models import User
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+FORMAT_MEDIA_TYPES = {
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+}
+
+
+def get_query_number(request, name):
+    """
+    Возвращает неотрицательное целое из параметра name
+    или None, если он не задан или некорректен.
+    """
+    if request is None:
+        return None
+    try:
+        value = int(request.query_params.get(name))
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def get_recipes_limit(request):
+    return get_query_number(request, 'recipes_limit')
+
+
+def get_ingredient_ids(request):
+    """
+    Возвращает id ингредиентов из параметра ingredients:
+    через запятую или повторением параметра.
+    """
+    try:
+        ingredient_ids = {
+            int(value)
+            for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value.strip()
+        }
+    except ValueError:
+        raise serializers.ValidationError(
+            {'ingredients': 'Укажите id ингредиентов через запятую'})
+    if not ingredient_ids:
+        raise serializers.ValidationError(
+            {'ingredients': 'Укажите хотя бы один ингредиент'})
+    return ingredient_ids
+
+
+def lock_user(user):
+    """
+    Блокирует строку пользователя до конца транзакции,
+    чтобы изменения его избранного и корзины, одиночные
+    и массовые, выполнялись по очереди.
+    """
+    list(User.objects.select_for_update().filter(
+        id=user.id).values_list('id', flat=True))
+
+
+def get_shopping_cart_etag(user, file_format):
+    """
+    Возвращает ETag списка покупок пользователя: хеш тех же
+    строк ShoppingListItem, из которых строится выгрузка,
+    и версии справочника ингредиентов с их названиями.
+    Форматы отдаются по одному адресу, поэтому формат
+    входит в ETag.
+    """
+    digest = hashlib.md5()
+    for ingredient_id, total in ShoppingListItem.objects.filter(
+            user=user).order_by('ingredient_id').values_list(
+                'ingredient_id', 'total'):
+        digest.update(f'{ingredient_id}:{total};'.encode())
+    version, updated_at = TableVersion.objects.get_version(
+        Ingredient._meta.db_table)
+    return quote_etag(
+        f'cart-{user.id}-{file_format}-{version}-{digest.hexdigest()}')
+
+
+def shopping_cart_txt(ingredients):
+    yield 'Необходимо приобрести:\n'
+    for ingredient in ingredients:
+        yield (
+            f"{ingredient['ingredient__name']}-"
+            f"{ingredient['ingredient_total']}/"
+            f"{ingredient['ingredient__measurement_unit']}\n")
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: возвращает
+    строку вместо записи в файл.
+    """
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient_total'],
+            ingredient['ingredient__measurement_unit']))
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+}
+
+
+def create_shopping_cart(ingredients, file_format='txt', etag=None):
+    """
+    Отдает список покупок потоком: строки формируются
+    по мере чтения курсора, не собираясь целиком в памяти.
+    """
+    lines = SHOPPING_CART_FORMATS[file_format](
+        ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE))
+    file = f'shopping.{file_format}'
+    response = StreamingHttpResponse(
+        lines, content_type=f'{FORMAT_MEDIA_TYPES[file_format]}; '
+                            'charset=utf-8')
     response['Content-Disposition'] = f'attachment; filename={file}'
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
     return response
@@ -1,26 +1,55 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch, Q,
+                              Subquery, Sum, Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from foodgram.bulk import delete_rows
+from foodgram.counters import change_link_counters
+from foodgram.ingredient_index import ingredient_index
 from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                             ShoppingCart, Tag)
+                             RecipeTrend, ShoppingCart, ShoppingListItem,
+                             SimilarRecipe, TableVersion, Tag)
+from foodgram.recipe_match import recipe_match_index
+from foodgram.recipe_transfer import (RecipeImporter, iter_ndjson,
+                                      iter_recipe_records)
 from rest_framework import filters, serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from users.models import Subscribe, User
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import PagePagination
+from .cache import (RECIPE_CACHE_TIMEOUT, RecipeCache, bump_version,
+                    cache_stats, user_version_key)
+from .filters import IngredientFilter, RecipeFilter, RecipeSearchFilter
+from .mixins import ConditionalGetMixin, TableVersionMixin
+from .pagination import (PagePagination, RecipePagination,
+                         SubscribePagination)
+from .parsers import NDJSONParser
 from .permissions import AuthorOrReadOnly
+from .renderers import (FileDownloadNegotiation, ShoppingCartCsvRenderer,
+                        ShoppingCartTxtRenderer)
 from .serializers import (CustomUserSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeReadSerializer,
-                          RecipeWriteSerializer, SubscribeSerializer,
-                          TagSerializer)
-from .utils import create_shopping_cart
+                          IngredientSerializer, RecipeIdsSerializer,
+                          RecipeReadSerializer, RecipeWriteSerializer,
+                          SubscribeSerializer, TagSerializer)
+from .utils import (create_shopping_cart, get_ingredient_ids,
+                    get_query_number, get_recipes_limit,
+                    get_shopping_cart_etag, lock_user)
 
+INGREDIENT_SEARCH_LIMIT = getattr(settings, 'INGREDIENT_SEARCH_LIMIT', 50)
+INGREDIENT_SEARCH_MAX = getattr(settings, 'INGREDIENT_SEARCH_MAX', 200)
+RECOMMENDATIONS_LIMIT = getattr(settings, 'RECOMMENDATIONS_LIMIT', 10)
+RECOMMENDATIONS_MAX_LIMIT = 100
+# Сортировки по счетчикам, которые меняются без смены версий таблиц.
+COUNTER_ORDERING_FIELDS = {'favorites_count', 'in_carts_count'}
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class TagViewSet(TableVersionMixin, viewsets.ModelViewSet):
     """
     Вьюсет для отображения тэгов.
     """
@@ -29,7 +58,7 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(TableVersionMixin, viewsets.ModelViewSet):
     """
     Вьюсет для отображения ингредиентов.
     """
@@ -40,6 +69,26 @@ class IngredientViewSet(viewsets.ModelViewSet):
     search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Автодополнение по ?name= обслуживается индексом
+        в памяти той же версии таблицы, что и ETag;
+        ?limit= ограничен отрезком 1..INGREDIENT_SEARCH_MAX.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = int(request.query_params.get(
+                'limit', INGREDIENT_SEARCH_LIMIT))
+        except ValueError:
+            limit = INGREDIENT_SEARCH_LIMIT
+        limit = min(max(limit, 1), INGREDIENT_SEARCH_MAX)
+        return self.conditional(
+            request,
+            lambda request: Response(ingredient_index.search(
+                name, self.get_table_version()[0], limit)))
+
 
 class CustomUserViewSet(UserViewSet):
     """
@@ -50,10 +99,26 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False,
             methods=['GET'],
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            pagination_class=SubscribePagination)
     def subscriptions(self, request):
+        """
+        Лента подписок: число рецептов автора хранится
+        в счетчике, а последние recipes_limit рецептов всех
+        авторов страницы подгружаются одним запросом.
+        """
         user = self.request.user
-        queryset = Subscribe.objects.filter(user=user)
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date').values('id')[:recipes_limit]))
+        authors = User.objects.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview'))
+        queryset = Subscribe.objects.filter(user=user).prefetch_related(
+            Prefetch('author', queryset=authors))
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages,
@@ -70,29 +135,290 @@ class CustomUserViewSet(UserViewSet):
             if request.user.id == author.id:
                 raise serializers.ValidationError(
                     detail='Нельзя подписаться на самого себя')
+            with transaction.atomic():
+                subscribe = Subscribe.objects.create(
+                    user=request.user, author=author)
             serializer = SubscribeSerializer(
-                Subscribe.objects.create(user=request.user, author=author),
-                context={'request': request},)
+                subscribe, context={'request': request},)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
             if Subscribe.objects.filter(user=request.user,
                                         author=author).exists():
-                Subscribe.objects.filter(
-                    user=request.user, author=author).delete()
+                with transaction.atomic():
+                    Subscribe.objects.filter(
+                        user=request.user, author=author).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Вьюсет для отображения рецептов.
     """
-    queryset = Recipe.objects.all().order_by('-id')
+    queryset = Recipe.objects.all().order_by('-pub_date', '-id')
+    # Нечисловой id отсекается маршрутом (404), а не падает
+    # в запросах действий, которые не загружают рецепт.
+    lookup_value_regex = r'\d+'
     permission_classes = (AuthorOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter)
     filterset_class = RecipeFilter
-    pagination_class = PagePagination
+    pagination_class = RecipePagination
+
+    @staticmethod
+    def annotate_recipes(queryset, user):
+        """
+        Флаги избранного, корзины и подписки на автора
+        вычисляются в том же запросе через Exists(),
+        связанные объекты подгружаются заранее, поэтому
+        число запросов не зависит от размера страницы.
+        """
+        authors = User.objects.all()
+        if user.is_anonymous:
+            queryset = queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=BooleanField()))
+            authors = authors.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+            authors = authors.annotate(
+                is_subscribed=Exists(Subscribe.objects.filter(
+                    user=user, author=OuterRef('pk'))))
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'ingredientrecipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient')))
+
+    def get_queryset(self):
+        return self.annotate_recipes(self.queryset, self.request.user)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'trending':
+            queryset = queryset.filter(
+                trend__isnull=False).order_by('-trend__score', '-id')
+        return queryset
+
+    def load_recipes(self, recipe_ids):
+        queryset = self.annotate_recipes(
+            Recipe.objects.filter(id__in=recipe_ids), AnonymousUser())
+        return RecipeReadSerializer(
+            queryset,
+            many=True,
+            context=self.get_serializer_context()).data
+
+    def get_validators(self, request):
+        """
+        ETag выдачи строится по версиям таблиц рецептов (вместе
+        с составом, тэгами и авторами), справочников, рейтинга
+        и отметок пользователя: один запрос по уникальному
+        индексу, без обхода отфильтрованных рецептов.
+        Порядок по счетчикам популярности меняется без смены
+        версий, поэтому такие выдачи не кешируются клиентом.
+        """
+        ordering = {
+            field.strip().lstrip('-')
+            for field in request.query_params.get('ordering', '').split(',')}
+        if ordering & COUNTER_ORDERING_FIELDS:
+            return None, None
+        user = request.user
+        tables = [Recipe._meta.db_table, Tag._meta.db_table,
+                  Ingredient._meta.db_table]
+        if self.action == 'trending':
+            tables.append(RecipeTrend._meta.db_table)
+        if not user.is_anonymous:
+            tables.append(TableVersion.objects.user_key(user.id))
+        versions = TableVersion.objects.get_versions(tables)
+        updated = [
+            updated_at for version, updated_at in versions if updated_at]
+        return (
+            '{}-{}-{}'.format(
+                user.id, request.get_full_path(),
+                [version for version, updated_at in versions]),
+            max(updated) if user.is_anonymous and updated else None)
+
+    def list(self, request, *args, **kwargs):
+        if RECIPE_CACHE_TIMEOUT:
+            return self.list_recipes(request)
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if RECIPE_CACHE_TIMEOUT:
+            return self.retrieve_recipe(request, *args, **kwargs)
+        return self.conditional(
+            request, super().retrieve, *args, **kwargs)
+
+    @action(detail=False,
+            methods=['GET'],
+            pagination_class=PagePagination)
+    def trending(self, request, *args, **kwargs):
+        """
+        Популярные рецепты по рейтингу, заранее рассчитанному
+        командой compute_trending. Фильтры те же, что у списка.
+        """
+        return self.list(request, *args, **kwargs)
+
+    def cached_response(self, request, recipes, get_response, state=''):
+        """
+        Ответ из кеша рецептов. ETag строится по ключам
+        кеша, а не отдельным запросом к базе, поэтому
+        совпадает с отдаваемым телом, а ответ 304
+        не требует чтения тел рецептов. Сотрудникам
+        отдаются счетчики кеша запроса и процесса.
+        """
+        recipe_cache = RecipeCache(request, self.load_recipes)
+        keys = recipe_cache.get_keys(recipes)
+        etag = self.make_etag('{}-{}-{}'.format(
+            request.get_full_path(), state,
+            recipe_cache.get_etag(recipes, keys)))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = get_response(recipe_cache.get_many(recipes, keys))
+        response['ETag'] = etag
+        if request.user.is_staff:
+            response['X-Recipe-Cache'] = recipe_cache.header()
+            response['X-Recipe-Cache-Totals'] = cache_stats.header()
+        return response
+
+    def list_recipes(self, request):
+        """
+        Из базы выбираются только id рецептов страницы,
+        сами рецепты и отметки пользователя берутся из кеша.
+        """
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).prefetch_related(None).only('id', 'author', 'pub_date')
+        page = self.paginate_queryset(queryset)
+        recipes = [
+            (recipe.id, recipe.author_id)
+            for recipe in (queryset if page is None else page)]
+        if page is None:
+            return self.cached_response(request, recipes, Response)
+        return self.cached_response(
+            request, recipes, self.get_paginated_response,
+            sorted(self.get_paginated_response([]).data.items()))
+
+    def retrieve_recipe(self, request, *args, **kwargs):
+        recipe = get_object_or_404(
+            self.filter_queryset(
+                self.get_queryset()
+            ).prefetch_related(None).only('id', 'author'),
+            pk=kwargs['pk'])
+        return self.cached_response(
+            request, [(recipe.id, recipe.author_id)],
+            lambda data: Response(data[0]))
+
+    def serialize_recipes(self, request, recipes):
+        """
+        Выдача для списка пар (id рецепта, id автора)
+        в исходном порядке: из кеша, если он включен,
+        иначе одним запросом с подгрузкой связей.
+        """
+        if RECIPE_CACHE_TIMEOUT:
+            return RecipeCache(request, self.load_recipes).get_many(recipes)
+        positions = {
+            recipe_id: position
+            for position, (recipe_id, author_id) in enumerate(recipes)
+        }
+        return sorted(
+            RecipeReadSerializer(
+                self.annotate_recipes(
+                    Recipe.objects.filter(id__in=positions), request.user),
+                many=True,
+                context=self.get_serializer_context()).data,
+            key=lambda item: positions[item['id']])
+
+    def get_recommendations_limit(self, request):
+        limit = get_query_number(request, 'limit')
+        if not limit:
+            return RECOMMENDATIONS_LIMIT
+        return min(limit, RECOMMENDATIONS_MAX_LIMIT)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты по совместным добавлениям в избранное
+        и корзину, заранее рассчитанные командой
+        compute_similar_recipes.
+        """
+        recipes = list(SimilarRecipe.objects.filter(
+            recipe_id=pk
+        ).order_by('-score').values_list(
+            'similar_id', 'similar__author_id'
+        )[:self.get_recommendations_limit(request)])
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(self.serialize_recipes(request, recipes))
+
+    @action(detail=False,
+            methods=['GET'],
+            url_path='for_you',
+            permission_classes=(IsAuthenticated,))
+    def for_you(self, request):
+        """
+        Рекомендации: рецепты, похожие на избранное и корзину
+        пользователя, по сумме сходства. Пока истории нет,
+        выдаются популярные рецепты.
+        """
+        user_recipes = (
+            Q(id__in=Favorite.objects.filter(
+                user=request.user).values('recipe_id'))
+            | Q(id__in=ShoppingCart.objects.filter(
+                user=request.user).values('recipe_id')))
+        limit = self.get_recommendations_limit(request)
+        recipes = list(Recipe.objects.filter(
+            similar_to__recipe__in=Recipe.objects.filter(user_recipes)
+        ).exclude(user_recipes).values_list('id', 'author_id').annotate(
+            score=Sum('similar_to__score')
+        ).order_by('-score', '-id')[:limit])
+        if not recipes:
+            recipes = Recipe.objects.filter(
+                trend__isnull=False
+            ).exclude(user_recipes).order_by(
+                '-trend__score', '-id'
+            ).values_list('id', 'author_id')[:limit]
+        return Response(self.serialize_recipes(request, [
+            (recipe_id, author_id) for recipe_id, author_id, *score in recipes
+        ]))
+
+    @action(detail=False,
+            methods=['GET'],
+            pagination_class=PagePagination)
+    def match(self, request):
+        """
+        Рецепты из имеющихся ингредиентов ?ingredients=1,2,3:
+        сначала те, где не хватает меньше ингредиентов,
+        ?max_missing= ограничивает число недостающих.
+        """
+        found = recipe_match_index.search(
+            get_ingredient_ids(request),
+            get_query_number(request, 'max_missing'))
+        page = self.paginate_queryset(found)
+        coverage = {
+            recipe_id: (matched, missing)
+            for recipe_id, matched, missing in page
+        }
+        authors = dict(Recipe.objects.filter(
+            id__in=coverage).values_list('id', 'author_id'))
+        data = self.serialize_recipes(request, [
+            (recipe_id, authors[recipe_id])
+            for recipe_id, matched, missing in page
+            if recipe_id in authors
+        ])
+        for item in data:
+            item['matched_count'], item['missing_count'] = (
+                coverage[item['id']])
+        return self.get_paginated_response(data)
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -103,19 +429,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def add_recipe(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response({
-                'Рецепт уже добавлен'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            lock_user(user)
+            if model.objects.filter(user=user, recipe__id=pk).exists():
+                return Response({
+                    'Рецепт уже добавлен'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            recipe = get_object_or_404(Recipe, id=pk)
+            model.objects.create(user=user, recipe=recipe)
         serializer = FavoriteSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            lock_user(user)
+            deleted, _ = model.objects.filter(
+                user=user, recipe__id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
             'Рецепт уже удален'
@@ -139,14 +469,178 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_recipe(ShoppingCart, request.user, pk)
         return self.delete_recipe(ShoppingCart, request.user, pk)
 
+    def add_recipes(self, model, user, recipe_ids):
+        """
+        Добавляет рецепты одним bulk_create. Массовая вставка
+        не отправляет сигналы, поэтому счетчики, список покупок
+        и версия кеша пользователя обновляются здесь же.
+        """
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        with transaction.atomic():
+            lock_user(user)
+            existing = set(model.objects.filter(
+                user=user, recipe_id__in=found
+            ).values_list('recipe_id', flat=True))
+            added = [
+                model(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+                if recipe_id in found and recipe_id not in existing
+            ]
+            model.objects.bulk_create(added, ignore_conflicts=True)
+            change_link_counters(model, added, 1)
+            if model is ShoppingCart:
+                ShoppingListItem.objects.add_recipe(
+                    user, *[link.recipe_id for link in added])
+            if added:
+                bump_version(user_version_key(user.id))
+                TableVersion.objects.bump(
+                    TableVersion.objects.user_key(user.id))
+        return Response([
+            {'id': recipe_id,
+             'status': ('not_found' if recipe_id not in found
+                        else 'exists' if recipe_id in existing
+                        else 'added')}
+            for recipe_id in recipe_ids
+        ])
+
+    def delete_recipes(self, model, user, recipe_ids=None):
+        """
+        Удаляет рецепты одним DELETE без сигналов, поэтому
+        счетчики, список покупок и версии обновляются здесь
+        же, как в add_recipes. Без recipe_ids удаляются
+        все рецепты пользователя.
+        """
+        with transaction.atomic():
+            lock_user(user)
+            links = model.objects.filter(user=user)
+            if recipe_ids is not None:
+                links = links.filter(recipe_id__in=recipe_ids)
+            links = list(links.only('id', 'user_id', 'recipe_id'))
+            deleted_ids = {link.recipe_id for link in links}
+            delete_rows(model, [link.id for link in links])
+            change_link_counters(model, links, -1)
+            if model is ShoppingCart:
+                ShoppingListItem.objects.remove_recipe(user, *deleted_ids)
+            if links:
+                bump_version(user_version_key(user.id))
+                TableVersion.objects.bump(
+                    TableVersion.objects.user_key(user.id))
+        if recipe_ids is None:
+            recipe_ids = sorted(deleted_ids)
+        return Response([
+            {'id': recipe_id,
+             'status': 'deleted' if recipe_id in deleted_ids else 'not_found'}
+            for recipe_id in recipe_ids
+        ])
+
+    def bulk_recipes(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return self.add_recipes(model, request.user, recipe_ids)
+        return self.delete_recipes(model, request.user, recipe_ids)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            url_path='favorite',
+            url_name='favorite-bulk',
+            permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        """
+        Массовое добавление в избранное и удаление
+        из него: {"recipes": [1, 2, 3]}.
+        """
+        return self.bulk_recipes(request, Favorite)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            url_path='shopping_cart',
+            url_name='shopping-cart-bulk',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        """
+        Массовое добавление в корзину и удаление
+        из нее: {"recipes": [1, 2, 3]}.
+        """
+        return self.bulk_recipes(request, ShoppingCart)
+
+    @action(detail=False,
+            methods=['DELETE'],
+            url_path='shopping_cart/clear',
+            permission_classes=(IsAuthenticated,))
+    def clear_shopping_cart(self, request):
+        """
+        Очистка корзины одним запросом.
+        """
+        return self.delete_recipes(ShoppingCart, request.user)
+
     @action(detail=False,
             methods=['GET'],
             url_path='download_shopping_cart',
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingCartTxtRenderer,
+                              ShoppingCartCsvRenderer),
+            content_negotiation_class=FileDownloadNegotiation)
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart_recipe__user=request.user
-        ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_total=Sum('amount'))
-        return create_shopping_cart(ingredients)
+        """
+        Скачивание списка покупок: ?format=txt|csv.
+        Повторный запрос с If-None-Match при неизменной
+        корзине получает 304 без выгрузки списка.
+        """
+        file_format = request.accepted_renderer.format
+        etag = get_shopping_cart_etag(request.user, file_format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            ingredients = ShoppingListItem.objects.filter(
+                user=request.user
+            ).order_by('ingredient__name').values(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).annotate(ingredient_total=Sum('total'))
+            response = create_shopping_cart(ingredients, file_format, etag)
+        # Формат выбирается и по Accept: кеши не должны отдавать
+        # один формат на запрос другого.
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @action(detail=False,
+            methods=['GET'],
+            url_path='export',
+            permission_classes=(IsAdminUser,))
+    def export_recipes(self, request):
+        """
+        Выгрузка рецептов потоком NDJSON для администраторов,
+        ?author=<id> ограничивает выгрузку одним автором.
+        """
+        queryset = Recipe.objects.all()
+        author = get_query_number(request, 'author')
+        if author is not None:
+            queryset = queryset.filter(author_id=author)
+        response = StreamingHttpResponse(
+            iter_ndjson(iter_recipe_records(queryset)),
+            content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = (
+            'attachment; filename=recipes.ndjson')
+        return response
+
+    @action(detail=False,
+            methods=['POST'],
+            url_path='import',
+            permission_classes=(IsAdminUser,),
+            parser_classes=(NDJSONParser,))
+    def import_recipes(self, request):
+        """
+        Загрузка рецептов из тела запроса в NDJSON
+        для администраторов. Тело читается построчно,
+        в ответе число добавленных рецептов и ошибки.
+        """
+        importer = RecipeImporter().run(request.data)
+        return Response({
+            'created': importer.created,
+            'failed': importer.failed,
+            'errors': importer.errors,
+        }, status=(
+            status.HTTP_201_CREATED if importer.created
+            else status.HTTP_400_BAD_REQUEST if importer.failed
+            else status.HTTP_200_OK))
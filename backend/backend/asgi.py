@@ -0,0 +1,75 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref import wsgi
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+RESPONSE_BUFFER_SIZE = 64 * 1024
+
+
+class WsgiToAsgiInstance(wsgi.WsgiToAsgiInstance):
+    """
+    Запрос Django выполняется в ограниченном пуле потоков,
+    а чтение тела запроса и отправка ответа медленному
+    клиенту остаются в цикле событий и поток не занимают.
+    """
+    executor = None
+
+    async def run_wsgi_app(self, body):
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor, self.run_wsgi_app_sync, body)
+
+    def run_wsgi_app_sync(self, body):
+        environ = self.build_environ(self.scope, body)
+        response = self.wsgi_application(environ, self.start_response)
+        try:
+            # Потоковые ответы отдают данные по строке, а каждая
+            # отправка ждет цикл событий, поэтому куски копятся.
+            buffer = []
+            size = 0
+            for output in response:
+                buffer.append(output)
+                size += len(output)
+                if size >= RESPONSE_BUFFER_SIZE:
+                    self.send_body(b''.join(buffer), more_body=True)
+                    buffer = []
+                    size = 0
+            self.send_body(b''.join(buffer), more_body=False)
+        finally:
+            # Django отправляет request_finished и закрывает
+            # соединения с базой данных только в close().
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    def send_body(self, body, more_body):
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({
+            'type': 'http.response.body',
+            'body': body,
+            'more_body': more_body,
+        })
+
+
+class WsgiToAsgi(wsgi.WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await WsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+if django.VERSION >= (3, 0):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+else:
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    WsgiToAsgiInstance.executor = ThreadPoolExecutor(
+        max_workers=settings.ASGI_WORKER_THREADS,
+        thread_name_prefix='asgi')
+    application = WsgiToAsgi(get_wsgi_application())
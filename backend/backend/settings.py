@@ -1,4 +1,5 @@
 import os
+import sys
 
 from dotenv import load_dotenv
 
@@ -10,6 +11,8 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'default')
 
 DEBUG = False
 
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
@@ -27,11 +30,11 @@ INSTALLED_APPS = [
     'djoser',
     'colorfield',
     'django_filters',
-    'drf_yasg',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -45,7 +48,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -104,10 +107,42 @@ else:
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default=5432)
+            'PORT': os.getenv('DB_PORT', default=5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+# Кеш рецептов включается только с общим для воркеров CACHE_BACKEND
+# (memcached, Redis): в LocMemCache у каждого процесса свои версии.
+# В отладке и тестах (один процесс) его можно включить и с LocMemCache.
+RECIPE_CACHE_TIMEOUT = int(os.getenv(
+    'RECIPE_CACHE_TIMEOUT',
+    default=0 if CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')) else 300))
+
+DB_INSTRUMENTATION = os.getenv('DB_INSTRUMENTATION', default='True') == 'True'
+DB_SLOW_REQUEST_QUERIES = int(os.getenv('DB_SLOW_REQUEST_QUERIES', default=50))
+
+API_DOCS = os.getenv('API_DOCS', default='False') == 'True'
+if API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+API_DOCS_CACHE_TIMEOUT = int(os.getenv('API_DOCS_CACHE_TIMEOUT', default=3600))
+API_SCHEMA_FILE = os.path.join(BASE_DIR, 'api', 'static', 'api', 'swagger.json')
+
+ASGI_WORKER_THREADS = int(os.getenv('ASGI_WORKER_THREADS', default=10))
+
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=30))
+AUTH_TOKEN_SHARED_CACHE = os.getenv(
+    'AUTH_TOKEN_SHARED_CACHE', default='') == 'True'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     RecipeTrend, ShoppingCart, ShoppingListItem,
+                     SimilarRecipe, Tag)
 
 
 class IngredientInline(admin.TabularInline):
@@ -28,13 +29,15 @@ class RecipeAdmin(admin.ModelAdmin):
     в зоне администратора.
     """
     inlines = (IngredientInline, )
-    list_display = ('name', 'author', 'add_favorites')
+    list_display = ('name', 'author', 'add_favorites', 'in_carts_count')
     readonly_fields = ('add_favorites',)
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
 
     def add_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
+
+    add_favorites.admin_order_field = 'favorites_count'
 
 
 @admin.register(Tag)
@@ -59,6 +62,38 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """
+    Модель просмотра агрегированных списков
+    покупок в зоне администратора.
+    """
+    list_display = ('user', 'ingredient', 'total',)
+    list_filter = ('user', )
+    empty_value_display = '-пусто-'
+
+
+@admin.register(RecipeTrend)
+class RecipeTrendAdmin(admin.ModelAdmin):
+    """
+    Модель просмотра рейтинга популярных
+    рецептов в зоне администратора.
+    """
+    list_display = ('recipe', 'score', 'computed_at',)
+    empty_value_display = '-пусто-'
+
+
+@admin.register(SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    """
+    Модель просмотра похожих рецептов
+    в зоне администратора.
+    """
+    list_display = ('recipe', 'similar', 'score',)
+    list_select_related = ('recipe', 'similar')
+    empty_value_display = '-пусто-'
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     """
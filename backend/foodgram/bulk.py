@@ -0,0 +1,79 @@
+from django.db import connection
+
+INSERT_ROWS_BATCH_SIZE = 5000
+
+
+def get_batch_size(fields, objects, limit):
+    """
+    Размер пакета массовой вставки не больше limit
+    и допустимого для базы: Django 2.2 не ограничивает
+    явно заданный batch_size, а SQLite не принимает
+    больше 999 параметров в одном запросе.
+    """
+    return max(1, min(limit, connection.ops.bulk_batch_size(fields, objects)))
+
+
+def bulk_create_with_ids(model, objects, batch_size=None):
+    """
+    Массовая вставка с заполнением id у объектов.
+    PostgreSQL возвращает id сам, на прочих базах новые
+    строки находятся как id больше прежнего максимума,
+    поэтому вызывать нужно внутри транзакции.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objects, batch_size=batch_size)
+        return [obj.id for obj in objects]
+    last = model.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    ids = list(model.objects.filter(id__gt=last).order_by(
+        'id').values_list('id', flat=True))
+    for obj, pk in zip(objects, ids):
+        obj.id = pk
+    return ids
+
+
+def insert_rows(model, fields, rows):
+    """
+    Многострочный INSERT готовых значений без создания
+    объектов модели. Для строк таблиц связей, которым не нужны
+    сигналы и значения по умолчанию, это в разы быстрее
+    bulk_create, где основное время уходит на объекты
+    и подготовку каждого поля.
+    """
+    ops = connection.ops
+    table = ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        ops.quote_name(model._meta.get_field(field).column)
+        for field in fields)
+    row_sql = '({})'.format(', '.join(['%s'] * len(fields)))
+    size = get_batch_size(fields, rows, INSERT_ROWS_BATCH_SIZE)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES '
+                + ', '.join([row_sql] * len(chunk)),
+                [value for row in chunk for value in row])
+
+
+def delete_rows(model, pks):
+    """
+    Удаляет строки по первичным ключам без сборщика
+    каскадов и сигналов: одним DELETE на пакет. Только
+    для строк, на которые никто не ссылается; счетчики
+    и прочее, что обновляют сигналы, вызывающий
+    обновляет сам.
+    """
+    ops = connection.ops
+    table = ops.quote_name(model._meta.db_table)
+    column = ops.quote_name(model._meta.pk.column)
+    pks = list(pks)
+    size = get_batch_size((model._meta.pk,), pks, INSERT_ROWS_BATCH_SIZE)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), size):
+            chunk = pks[start:start + size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {column} IN ({placeholders})',
+                chunk)
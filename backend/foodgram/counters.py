@@ -0,0 +1,57 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Subscribe, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Счетчик: (модель, поле, модель связи, поле связи на модель).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscribe, 'author'),
+)
+
+
+def change_counters(model, field, pks, delta):
+    """
+    Атомарно изменяет счетчики объектов pks выражением F()
+    в текущей транзакции, не опуская их ниже нуля.
+    Повторы в pks складываются.
+    """
+    by_delta = defaultdict(list)
+    for pk, count in Counter(pk for pk in pks if pk is not None).items():
+        by_delta[count * delta].append(pk)
+    for value, group in by_delta.items():
+        queryset = model.objects.filter(pk__in=group)
+        if value < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -value})
+        queryset.update(**{field: F(field) + value})
+
+
+def change_link_counters(link_model, links, delta):
+    """
+    Изменяет счетчики, зависящие от строк связи links.
+    Вызывается из сигналов, а при массовой вставке
+    или удалении без сигналов — явно.
+    """
+    for model, field, counted_model, link_field in COUNTERS:
+        if counted_model is link_model:
+            change_counters(model, field, [
+                getattr(link, f'{link_field}_id') for link in links
+            ], delta)
+
+
+def actual_count(link_model, link_field):
+    """
+    Выражение с фактическим числом строк связи
+    для пересчета счетчика.
+    """
+    return Coalesce(Subquery(
+        link_model.objects.filter(
+            **{link_field: OuterRef('pk')}
+        ).order_by().values(link_field).annotate(
+            total=Count('pk')
+        ).values('total')), 0)
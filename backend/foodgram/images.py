@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RECIPE_IMAGE_VARIANTS = getattr(settings, 'RECIPE_IMAGE_VARIANTS', {
+    'card': 360,
+    'detail': 720,
+    'retina': 1440,
+})
+RECIPE_IMAGE_EXECUTOR = getattr(settings, 'RECIPE_IMAGE_EXECUTOR', 'thread')
+RECIPE_IMAGE_WORKERS = getattr(settings, 'RECIPE_IMAGE_WORKERS', 2)
+RECIPE_IMAGE_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(image_name, variant):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}-{variant}.webp'
+
+
+def get_srcset(image_name, build_url=None):
+    """
+    Строка srcset из готовых вариантов картинки.
+    """
+    urls = []
+    for variant, width in RECIPE_IMAGE_VARIANTS.items():
+        url = default_storage.url(variant_name(image_name, variant))
+        if build_url is not None:
+            url = build_url(url)
+        urls.append(f'{url} {width}w')
+    return ', '.join(urls)
+
+
+def delete_image_variants(image_name):
+    """
+    Удаляет варианты картинки, если она больше
+    не принадлежит ни одному рецепту: после импорта
+    одна картинка может быть у нескольких рецептов.
+    """
+    if not image_name or Recipe.objects.filter(image=image_name).exists():
+        return
+    for variant in RECIPE_IMAGE_VARIANTS:
+        default_storage.delete(variant_name(image_name, variant))
+
+
+def resize(image, width):
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info or 'A' in image.mode
+            else 'RGB')
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def create_image_variants(recipe_id):
+    """
+    Создает уменьшенные WebP-копии картинки рецепта
+    и отмечает рецепт, когда все варианты готовы.
+    Если за время обработки картинку заменили или
+    рецепт удалили, созданные варианты удаляются.
+    """
+    try:
+        recipe = Recipe.objects.only('id', 'image').get(id=recipe_id)
+        if not recipe.image:
+            return
+        with recipe.image.open('rb') as file:
+            source = Image.open(file)
+            source.load()
+        for variant, width in RECIPE_IMAGE_VARIANTS.items():
+            buffer = BytesIO()
+            resize(source, width).save(
+                buffer, 'WEBP', quality=RECIPE_IMAGE_QUALITY)
+            name = variant_name(recipe.image.name, variant)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        with transaction.atomic():
+            current = Recipe.objects.select_for_update().only(
+                'id', 'image').filter(id=recipe_id).first()
+            if current is not None and current.image.name == recipe.image.name:
+                current.image_variants_ready = True
+                current.save(update_fields=('image_variants_ready',))
+                return
+        delete_image_variants(recipe.image.name)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id)
+    finally:
+        if RECIPE_IMAGE_EXECUTOR != 'sync':
+            connections.close_all()
+
+
+def schedule_image_variants(recipe_id):
+    """
+    Ставит обработку картинки в очередь пула потоков
+    или, при RECIPE_IMAGE_EXECUTOR = 'sync', выполняет
+    ее сразу в текущем потоке.
+    """
+    global _executor
+    if RECIPE_IMAGE_EXECUTOR == 'sync':
+        create_image_variants(recipe_id)
+        return
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=RECIPE_IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images')
+    _executor.submit(create_image_variants, recipe_id)
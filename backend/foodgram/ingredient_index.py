@@ -0,0 +1,71 @@
+import threading
+from bisect import bisect_left
+
+from .models import Ingredient
+
+
+def normalize(value):
+    """
+    Приводит строку к виду для поиска: без учета
+    регистра, лишних пробелов и различия «ё» и «е».
+    """
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+class IngredientIndex:
+    """
+    Префиксный индекс ингредиентов в памяти процесса.
+    Помнит версию таблицы из TableVersion, с которой
+    был построен, и перестраивается, когда версия
+    изменилась, в том числе в другом процессе. Так ответ
+    всегда соответствует ETag, выданному по той же версии.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def invalidate(self):
+        self._index = None
+
+    def _get_index(self, version):
+        index = self._index
+        if index is not None and self._version == version:
+            return index
+        with self._lock:
+            if self._index is index:
+                rows = sorted(
+                    (normalize(name), pk, name, measurement_unit)
+                    for pk, name, measurement_unit
+                    in Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit').order_by())
+                self._version = version
+                self._index = (
+                    [row[0] for row in rows],
+                    [{'id': pk, 'name': name, 'measurement_unit': unit}
+                     for key, pk, name, unit in rows])
+            return self._index
+
+    def search(self, query, version, limit=None):
+        """
+        Возвращает ингредиенты, название которых начинается
+        с query, а за ними — содержащие query в середине.
+        version — текущая версия таблицы ингредиентов.
+        """
+        keys, items = self._get_index(version)
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        found = items[start:end]
+        if limit is not None and len(found) >= limit:
+            return found[:limit]
+        contains = sorted(
+            (key.find(query), index)
+            for index, key in enumerate(keys)
+            if (index < start or index >= end) and query in key)
+        found += [items[index] for position, index in contains]
+        return found if limit is None else found[:limit]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,437 @@
+import http.client
+import json
+import platform
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from statistics import mean
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from foodgram.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+PNG_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAAC'
+    'VBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAA'
+    'AggCByxOyYQAAAABJRU5ErkJggg==')
+
+
+def percentile(values, rank):
+    """
+    Процентиль по ближайшему рангу для отсортированного списка.
+    """
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[index]
+
+
+class TestClientTransport:
+    """
+    Запросы через тестовый клиент Django в этом же процессе.
+    Число запросов к базе считается напрямую.
+    """
+    name = 'client'
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        self.anonymous = Client()
+
+    def request(self, method, path, body=None, auth=True):
+        client = self.client if auth else self.anonymous
+        kwargs = {}
+        if body is not None:
+            kwargs = {'data': json.dumps(body),
+                      'content_type': 'application/json'}
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            response = getattr(client, method.lower())(path, **kwargs)
+            content = (
+                b''.join(response.streaming_content) if response.streaming
+                else response.content)
+            elapsed = perf_counter() - started
+        return response.status_code, content, elapsed, len(queries)
+
+
+class HttpTransport:
+    """
+    Запросы к запущенному серверу, например gunicorn, по
+    постоянному соединению. Число запросов к базе берется
+    из заголовка X-DB-Queries, который отдается сотрудникам.
+    """
+
+    def __init__(self, base_url, token):
+        url = urlsplit(base_url)
+        self.name = base_url
+        self.prefix = url.path.rstrip('/')
+        connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https'
+            else http.client.HTTPConnection)
+        self.connection = connection_class(url.netloc, timeout=60)
+        self.token = token
+
+    def send(self, method, path, body, headers):
+        self.connection.request(
+            method, self.prefix + path, body=body, headers=headers)
+        return self.connection.getresponse()
+
+    def request(self, method, path, body=None, auth=True):
+        headers = {'Accept': 'application/json'}
+        if auth:
+            headers['Authorization'] = f'Token {self.token}'
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        started = perf_counter()
+        try:
+            response = self.send(method, path, body, headers)
+        except (http.client.RemoteDisconnected, ConnectionResetError,
+                BrokenPipeError):
+            # Сервер закрыл простаивавшее keep-alive соединение.
+            self.connection.close()
+            started = perf_counter()
+            response = self.send(method, path, body, headers)
+        content = response.read()
+        elapsed = perf_counter() - started
+        queries = response.getheader('X-DB-Queries')
+        return (response.status, content, elapsed,
+                int(queries) if queries is not None else None)
+
+
+class Command(BaseCommand):
+    """
+    Замеряем задержки API и число запросов к базе:
+    список рецептов с каждым фильтром, лента подписок,
+    выгрузка списка покупок, подсказки ингредиентов,
+    создание и изменение рецепта. Результат сохраняется
+    в JSON и сравнивается с прошлым замером.
+    Данные для замера создает команда generate_fixtures.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера, например '
+                 'http://127.0.0.1:8000; по умолчанию запросы '
+                 'идут через тестовый клиент Django')
+        parser.add_argument(
+            '--email',
+            help='Пользователь, от имени которого идут запросы; '
+                 'по умолчанию самый активный подписчик')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Число одновременных клиентов, только с --base-url')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help='Замерить только указанные сценарии')
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом')
+        parser.add_argument(
+            '--output',
+            help='Сохранить результат в файл JSON')
+        parser.add_argument(
+            '--compare',
+            help='Сравнить с сохраненным ранее результатом')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=1.2,
+            help='Во сколько раз может вырасти p95 без отметки '
+                 'о регрессии')
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Завершиться с ошибкой при регрессии')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        token, _ = Token.objects.get_or_create(user=user)
+        if options['concurrency'] > 1 and not options['base_url']:
+            raise CommandError(
+                'Параллельные запросы поддерживаются только с --base-url')
+        if options['base_url']:
+            self.make_transport = partial(
+                HttpTransport, options['base_url'], token.key)
+        else:
+            self.make_transport = partial(TestClientTransport, token.key)
+        self.transport = transport = self.make_transport()
+        self.options = options
+        self.created = []
+        scenarios = self.get_scenarios()
+        selected = options['scenario'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}. '
+                f'Доступны: {", ".join(scenarios)}')
+        results = {}
+        try:
+            for name in selected:
+                results[name] = self.run_scenario(*scenarios[name])
+                self.write_result(name, results[name])
+        finally:
+            for recipe_id in self.created:
+                transport.request('DELETE', f'/api/recipes/{recipe_id}/')
+        report = {
+            'created': timezone.now().isoformat(),
+            'target': transport.name,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'cold': options['cold'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результат сохранен в {options["output"]}')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            if (baseline.get('cold') != options['cold']
+                    or baseline.get('concurrency', 1)
+                    != options['concurrency']):
+                self.stdout.write(self.style.WARNING(
+                    'Замеры сделаны в разных режимах кеша или с разным '
+                    'числом клиентов, сравнение неточно'))
+            regressions = self.compare(baseline['scenarios'], results)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'Регрессий: {regressions}')
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден')
+            return user
+        user = User.objects.annotate(
+            subscriptions=Count('subscriber')
+        ).order_by('-subscriptions', 'id').first()
+        if user is None:
+            raise CommandError(
+                'В базе нет пользователей, сначала выполните '
+                'generate_fixtures')
+        return user
+
+    def get_scenarios(self):
+        """
+        Сценарии: имя -> (метод, пути по кругу, тело запроса,
+        с токеном ли запрос, ожидаемые коды ответа).
+        Параметры фильтров берутся из самых частых значений.
+        """
+        tag = Tag.objects.annotate(
+            total=Count('recipes')).order_by('-total').first()
+        author = User.objects.order_by('-recipes_count', 'id').first()
+        popular = Recipe.objects.order_by(
+            '-favorites_count', '-id').values_list('id', flat=True)[:10]
+        ingredient_ids = list(IngredientInRecipe.objects.values(
+            'ingredient'
+        ).annotate(total=Count('id')).order_by(
+            '-total').values_list('ingredient', flat=True)[:10])
+        if not ingredient_ids:
+            raise CommandError(
+                'В базе нет рецептов, сначала выполните generate_fixtures')
+        names = dict(Ingredient.objects.filter(
+            id__in=ingredient_ids).values_list('id', 'name'))
+        word = names[ingredient_ids[0]].split()[0]
+        self.tag_id = tag.id
+        self.ingredient_ids = ingredient_ids
+        prefixes = sorted({
+            names[ingredient_id][:3].lower()
+            for ingredient_id in ingredient_ids})
+
+        def recipes(**params):
+            return [f'/api/recipes/?{urlencode(params)}']
+
+        return {
+            'tags': ('GET', ['/api/tags/'], None, False),
+            'recipe_detail': (
+                'GET', [f'/api/recipes/{pk}/' for pk in popular],
+                None, True),
+            'recipes_list': ('GET', recipes(), None, False),
+            'recipes_list_auth': ('GET', recipes(), None, True),
+            'recipes_tags': ('GET', recipes(tags=tag.slug), None, True),
+            'recipes_author': ('GET', recipes(author=author.id), None, True),
+            'recipes_favorited': (
+                'GET', recipes(is_favorited=1), None, True),
+            'recipes_in_cart': (
+                'GET', recipes(is_in_shopping_cart=1), None, True),
+            'recipes_search': ('GET', recipes(search=word), None, True),
+            'recipes_popular': (
+                'GET', recipes(ordering='-favorites_count'), None, True),
+            'subscriptions': (
+                'GET', ['/api/users/subscriptions/?recipes_limit=3'],
+                None, True),
+            'download_shopping_cart': (
+                'GET', ['/api/recipes/download_shopping_cart/'],
+                None, True),
+            'ingredients_autocomplete': (
+                'GET', [
+                    f'/api/ingredients/?{urlencode({"name": prefix})}'
+                    for prefix in prefixes
+                ], None, True),
+            'recipe_create': (
+                'POST', ['/api/recipes/'], self.recipe_body, True, (201,)),
+            'recipe_update': (
+                'PATCH', [self.recipe_to_update], self.recipe_body, True),
+        }
+
+    def recipe_body(self, version):
+        """
+        Тело рецепта: от версии зависят время, количества
+        и состав, чтобы изменение действительно что-то меняло.
+        """
+        shift = version % 3
+        return {
+            'name': f'Рецепт для замера {version}',
+            'text': 'Создан командой benchmark_api',
+            'cooking_time': 10 + version % 50,
+            'image': PNG_IMAGE,
+            'tags': [self.tag_id],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10 + version % 7}
+                for ingredient_id in self.ingredient_ids[shift:shift + 5]
+            ],
+        }
+
+    def recipe_to_update(self):
+        """
+        Изменяется рецепт, созданный самим замером.
+        """
+        if not self.created:
+            status, content, _, _ = self.transport.request(
+                'POST', '/api/recipes/', self.recipe_body(0))
+            if status != 201:
+                raise CommandError(
+                    f'Не удалось создать рецепт для замера: {status} '
+                    f'{content[:200]!r}')
+            self.created.append(json.loads(content)['id'])
+        return f'/api/recipes/{self.created[0]}/'
+
+    def run_scenario(self, method, paths, body, auth, expected=(200,)):
+        """
+        Прогрев идет последовательно, замер — в options['concurrency']
+        потоков, у каждого свое соединение с сервером.
+        """
+        options = self.options
+        paths = [path() if callable(path) else path for path in paths]
+
+        def run(number, transport):
+            data = body(number) if body is not None else None
+            if options['cold']:
+                cache.clear()
+            status, content, elapsed, count = transport.request(
+                method, paths[number % len(paths)], data, auth)
+            if status in expected and method == 'POST':
+                self.created.append(json.loads(content)['id'])
+            return status, elapsed, count
+
+        warmup = [
+            run(number, self.transport) for number in range(options['warmup'])
+        ]
+        numbers = range(
+            options['warmup'], options['warmup'] + options['requests'])
+        started = perf_counter()
+        if options['concurrency'] > 1:
+            local = threading.local()
+
+            def worker(number):
+                if not hasattr(local, 'transport'):
+                    local.transport = self.make_transport()
+                return run(number, local.transport)
+
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                samples = list(executor.map(worker, numbers))
+        else:
+            samples = [run(number, self.transport) for number in numbers]
+        wall = perf_counter() - started
+        errors = Counter(
+            status for status, _, _ in warmup + samples
+            if status not in expected)
+        timings = [elapsed * 1000 for _, elapsed, _ in samples]
+        queries = [count for _, _, count in samples if count is not None]
+        timings.sort()
+        queries.sort()
+        result = {
+            f'p{rank}': round(percentile(timings, rank), 2)
+            for rank in PERCENTILES
+        }
+        result.update({
+            'mean': round(mean(timings), 2),
+            'max': round(timings[-1], 2),
+            'queries': percentile(queries, 50) if queries else None,
+            'queries_max': queries[-1] if queries else None,
+            'throughput': round(len(samples) / wall, 1),
+            'errors': {str(code): count for code, count in errors.items()},
+        })
+        return result
+
+    def write_result(self, name, result):
+        queries = (
+            f'{result["queries"]} (макс. {result["queries_max"]})'
+            if result['queries'] is not None else 'н/д')
+        line = (
+            f'{name:<26} p50 {result["p50"]:>8.1f} мс  '
+            f'p95 {result["p95"]:>8.1f} мс  p99 {result["p99"]:>8.1f} мс  '
+            f'{result["throughput"]:>7.1f} зап/с  запросов к базе: {queries}')
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(
+                f'{line}  ошибки: {result["errors"]}'))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, baseline, results):
+        """
+        Печатает изменение p95 и числа запросов к базе
+        относительно сохраненного замера и возвращает
+        число регрессий.
+        """
+        regressions = 0
+        self.stdout.write(f'Сравнение с {self.options["compare"]}:')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f'{name:<26} нет в сохраненном замере')
+                continue
+            ratio = result['p95'] / before['p95'] if before['p95'] else 1
+            slower = ratio > self.options['threshold']
+            more_queries = (
+                result['queries'] is not None
+                and before['queries'] is not None
+                and result['queries'] > before['queries'])
+            line = (
+                f'{name:<26} p95 {before["p95"]:.1f} -> '
+                f'{result["p95"]:.1f} мс (x{ratio:.2f}), '
+                f'{before.get("throughput")} -> {result["throughput"]} зап/с')
+            if None not in (before['queries'], result['queries']):
+                line += (
+                    f', запросов {before["queries"]} -> {result["queries"]}')
+            if slower or more_queries:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'{line}  регрессия'))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,60 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from foodgram.recipe_match import RecipeMatchIndex
+
+
+class Command(BaseCommand):
+    """
+    Замеряем скорость подбора рецептов по ингредиентам
+    на синтетических данных без обращения к базе.
+    Популярность ингредиентов распределена по Ципфу,
+    как у соли и сахара относительно редких специй.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--query-size', type=int, default=10)
+        parser.add_argument('--max-missing', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        weights = [1 / rank for rank in ingredient_ids]
+
+        def sample(size):
+            chosen = set()
+            while len(chosen) < size:
+                chosen.update(rng.choices(ingredient_ids, weights, k=size))
+            return list(chosen)[:size]
+
+        rows = [
+            (recipe_id, ingredient_id)
+            for recipe_id in range(1, options['recipes'] + 1)
+            for ingredient_id in sample(options['per_recipe'])
+        ]
+        index = RecipeMatchIndex(ttl=float('inf'))
+        started = perf_counter()
+        index.build(rows)
+        self.stdout.write(
+            f'Индекс на {options["recipes"]} рецептов построен '
+            f'за {perf_counter() - started:.2f} с')
+        timings, found = [], 0
+        for _ in range(options['queries']):
+            query = sample(options['query_size'])
+            started = perf_counter()
+            found += len(index.search(query, options['max_missing']))
+            timings.append((perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов: {len(timings)}, '
+            f'медиана {median(timings):.1f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.1f} мс, '
+            f'максимум {timings[-1]:.1f} мс, '
+            f'в среднем найдено {found / len(timings):.0f} рецептов'))
@@ -0,0 +1,39 @@
+from time import monotonic
+
+from django.core.management import BaseCommand
+from foodgram.recommendations import (SIMILAR_MAX_USER_ITEMS,
+                                      SIMILAR_RECIPES_TOP,
+                                      rebuild_similar_recipes)
+
+
+class Command(BaseCommand):
+    """
+    Пересчитываем похожие рецепты по совместным добавлениям
+    в избранное и корзину. Команду нужно запускать
+    периодически, например из cron раз в сутки.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=SIMILAR_RECIPES_TOP,
+            help='Сколько похожих рецептов хранить для каждого рецепта')
+        parser.add_argument(
+            '--min-common',
+            type=int,
+            default=1,
+            help='Минимум общих пользователей у пары рецептов')
+        parser.add_argument(
+            '--max-user-items',
+            type=int,
+            default=SIMILAR_MAX_USER_ITEMS,
+            help='Сколько рецептов пользователя учитывать')
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        stored = rebuild_similar_recipes(
+            options['top'], options['min_common'], options['max_user_items'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны за {monotonic() - started:.2f} с, '
+            f'сохранено пар: {stored}'))
@@ -0,0 +1,18 @@
+from time import monotonic
+
+from django.core.management import BaseCommand
+from foodgram.trending import rebuild_trending
+
+
+class Command(BaseCommand):
+    """
+    Пересчитываем рейтинг популярных рецептов.
+    Команду нужно запускать периодически, например из cron.
+    """
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        count = rebuild_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг популярных рецептов пересчитан '
+            f'за {monotonic() - started:.2f} с, рецептов в рейтинге: {count}'))
@@ -0,0 +1,50 @@
+import sys
+from contextlib import ExitStack
+from time import monotonic
+
+from django.core.management import BaseCommand
+from foodgram.models import Recipe
+from foodgram.recipe_transfer import (RECIPE_EXPORT_CHUNK_SIZE, iter_ndjson,
+                                      iter_recipe_records)
+
+
+class Command(BaseCommand):
+    """
+    Выгружаем рецепты с ингредиентами, тэгами и ссылками
+    на картинки в NDJSON: по одному рецепту в строке.
+    Сами файлы картинок копируются вместе с каталогом media.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Файл для выгрузки, по умолчанию стандартный вывод')
+        parser.add_argument(
+            '--author',
+            help='Выгрузить только рецепты автора с этой почтой')
+        parser.add_argument(
+            '--chunk-size', type=int, default=RECIPE_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        queryset = Recipe.objects.all()
+        if options['author']:
+            queryset = queryset.filter(author__email=options['author'])
+        total = 0
+        with ExitStack() as stack:
+            if options['path'] == '-':
+                file, report = sys.stdout, self.stderr
+            else:
+                file = stack.enter_context(
+                    open(options['path'], 'w', encoding='utf-8'))
+                report = self.stdout
+            for line in iter_ndjson(iter_recipe_records(
+                    queryset, options['chunk_size'])):
+                file.write(line)
+                total += 1
+        elapsed = monotonic() - started
+        report.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} рецептов/с)'))
@@ -0,0 +1,240 @@
+import random
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+from time import monotonic
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from django.utils import timezone
+from foodgram.bulk import bulk_create_with_ids, get_batch_size
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, TableVersion, Tag)
+from users.models import Subscribe, User
+
+FIXTURE_PREFIX = 'fixture'
+
+
+class ZipfSampler:
+    """
+    Выбор из population с вероятностью, обратной рангу
+    в степени exponent. Ранги раздаются в случайном порядке,
+    чтобы популярность не совпадала с порядком id.
+    """
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)))
+
+    def choices(self, k):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k):
+        k = min(k, len(self.population))
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.choices(k - len(chosen)))
+        return list(chosen)
+
+
+class Command(BaseCommand):
+    """
+    Наполняем базу синтетическими пользователями, рецептами,
+    избранным, корзинами и подписками для нагрузочных замеров.
+    Популярность авторов, рецептов, ингредиентов и тэгов
+    распределена по Ципфу. Строки вставляются пакетами без
+    сигналов, поэтому счетчики и списки покупок пересчитываются
+    в конце. Нужны загруженные ингредиенты и тэги.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=100000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Среднее число ингредиентов в рецепте')
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа')
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='За сколько дней распределить даты публикаций '
+                 'и добавлений')
+        parser.add_argument(
+            '--password',
+            default='fixture-password',
+            help='Пароль всех созданных пользователей')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.values_list('id', 'name'))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not ingredients or not tag_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты и тэги: '
+                'load_ingr и load_tag')
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.now = timezone.now()
+        started = monotonic()
+        with transaction.atomic():
+            user_ids = self.create_users()
+            authors = ZipfSampler(self.rng, user_ids, options['exponent'])
+            recipe_ids = self.create_recipes(authors, ingredients, tag_ids)
+            users = ZipfSampler(self.rng, user_ids, options['exponent'])
+            recipes = ZipfSampler(self.rng, recipe_ids, options['exponent'])
+            self.stage('Избранное', lambda: self.create_links(
+                Favorite, users, recipes, options['favorites']))
+            self.stage('Корзины', lambda: self.create_links(
+                ShoppingCart, users, recipes, options['carts']))
+            self.stage('Подписки', lambda: self.create_subscriptions(
+                users, authors, options['subscriptions']))
+            for command in ('recount_counters', 'rebuild_shopping_list'):
+                output = StringIO()
+                call_command(command, stdout=output)
+                self.stdout.write(output.getvalue().splitlines()[-1])
+            TableVersion.objects.bump(Recipe._meta.db_table)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {monotonic() - started:.1f} с'))
+
+    def stage(self, title, create):
+        started = monotonic()
+        count = create()
+        self.stdout.write(
+            f'{title}: {count} за {monotonic() - started:.1f} с')
+        return count
+
+    def batch_size(self, model, objects):
+        return get_batch_size(
+            model._meta.concrete_fields, objects, self.options['batch_size'])
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size(model, objects),
+            ignore_conflicts=True)
+        return len(objects)
+
+    def past(self):
+        return self.now - timedelta(
+            seconds=self.rng.random() * self.options['days'] * 86400)
+
+    def create_users(self):
+        started = monotonic()
+        offset = User.objects.filter(
+            username__startswith=FIXTURE_PREFIX).count()
+        password = make_password(self.options['password'])
+        users = [
+            User(
+                username=f'{FIXTURE_PREFIX}{number}',
+                email=f'{FIXTURE_PREFIX}{number}@example.com',
+                first_name='Пользователь',
+                last_name=str(number),
+                password=password)
+            for number in range(offset, offset + self.options['users'])
+        ]
+        user_ids = bulk_create_with_ids(
+            User, users, self.batch_size(User, users))
+        self.stdout.write(
+            f'Пользователи: {len(user_ids)} за '
+            f'{monotonic() - started:.1f} с')
+        return user_ids
+
+    def create_recipes(self, authors, ingredient_rows, tag_ids):
+        """
+        Рецепты с тэгами и ингредиентами. Название и описание
+        составлены из ингредиентов, чтобы поиск находил
+        правдоподобное число рецептов.
+        """
+        started = monotonic()
+        rng, options = self.rng, self.options
+        ingredients = ZipfSampler(
+            rng, ingredient_rows, options['exponent'])
+        tags = ZipfSampler(rng, tag_ids, options['exponent'])
+        average = options['ingredients_per_recipe']
+        recipes, compositions = [], []
+        for number, author_id in enumerate(
+                authors.choices(options['recipes']), 1):
+            composition = ingredients.distinct(
+                rng.randint(max(1, average - 3), average + 3))
+            names = [name for _, name in composition]
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=f'{names[0].capitalize()} по рецепту {number}',
+                text=f'Нам понадобится: {", ".join(names)}.',
+                cooking_time=rng.randint(5, 180),
+                pub_date=self.past()))
+            compositions.append(composition)
+        recipe_ids = bulk_create_with_ids(
+            Recipe, recipes, self.batch_size(Recipe, recipes))
+        recipe_tags, amounts = [], []
+        for recipe_id, composition in zip(recipe_ids, compositions):
+            recipe_tags.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in tags.distinct(rng.randint(1, 3)))
+            amounts.extend(
+                IngredientInRecipe(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500))
+                for ingredient_id, _ in composition)
+        self.bulk_create(Recipe.tags.through, recipe_tags)
+        self.bulk_create(IngredientInRecipe, amounts)
+        self.stdout.write(
+            f'Рецепты: {len(recipe_ids)}, ингредиентов в них: '
+            f'{len(amounts)} за {monotonic() - started:.1f} с')
+        return recipe_ids
+
+    def sample_pairs(self, users, targets, count, allowed=None):
+        """
+        Различные пары (пользователь, объект) числом не больше
+        count. Выбор повторяется, пока популярные пары
+        не перестанут давать новые.
+        """
+        pairs = set()
+        for _ in range(20):
+            need = count - len(pairs)
+            if need <= 0:
+                break
+            before = len(pairs)
+            drawn = zip(users.choices(need), targets.choices(need))
+            pairs.update(
+                pair for pair in drawn if allowed is None or allowed(pair))
+            if len(pairs) == before:
+                break
+        return list(pairs)[:count]
+
+    def create_links(self, model, users, recipes, count):
+        pairs = self.sample_pairs(users, recipes, count)
+        return self.bulk_create(model, [
+            model(user_id=user_id, recipe_id=recipe_id, created=self.past())
+            for user_id, recipe_id in pairs
+        ])
+
+    def create_subscriptions(self, users, authors, count):
+        """
+        Подписываются чаще на тех, кто больше публикует.
+        """
+        pairs = self.sample_pairs(
+            users, authors, count,
+            allowed=lambda pair: pair[0] != pair[1])
+        return self.bulk_create(Subscribe, [
+            Subscribe(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        ])
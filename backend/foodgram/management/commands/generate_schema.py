@@ -0,0 +1,76 @@
+import json
+import os
+
+from api.schema import API_SCHEMA_FILE, generate_schema
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Генерируем схему API (/api/swagger.json) в статический файл.
+    С --check файл не меняется, а расхождение с кодом
+    завершает команду с ошибкой: так сборка не выкатит
+    устаревшую схему.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=API_SCHEMA_FILE,
+            help='Файл схемы, по умолчанию settings.API_SCHEMA_FILE')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить файл со схемой из кода')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        schema = generate_schema()
+        try:
+            with open(path, 'rb') as file:
+                current = file.read()
+        except FileNotFoundError:
+            current = None
+        if options['check']:
+            if current is None:
+                raise CommandError(f'Файл схемы {path} не найден')
+            if current != schema:
+                raise CommandError(
+                    f'Схема в {path} расходится с кодом: '
+                    f'{self.describe_drift(current, schema)}. '
+                    f'Обновите ее командой generate_schema')
+            self.stdout.write(self.style.SUCCESS(
+                f'Схема в {path} совпадает с кодом'))
+            return
+        if current == schema:
+            self.stdout.write(f'Схема в {path} не изменилась')
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(schema)
+        self.stdout.write(self.style.SUCCESS(
+            f'Схема записана в {path} ({len(schema)} байт)'))
+
+    @staticmethod
+    def describe_drift(current, schema):
+        """
+        Перечисляет добавленные, удаленные и измененные пути
+        вместо построчного diff всего файла.
+        """
+        try:
+            before = json.loads(current).get('paths', {})
+        except ValueError:
+            return 'файл не является JSON'
+        after = json.loads(schema)['paths']
+        changes = [
+            f'{label}: {", ".join(sorted(paths))}'
+            for label, paths in (
+                ('добавлены', after.keys() - before.keys()),
+                ('удалены', before.keys() - after.keys()),
+                ('изменены', {
+                    path for path in after.keys() & before.keys()
+                    if after[path] != before[path]}),
+            ) if paths
+        ]
+        return '; '.join(changes) or 'изменены определения'
@@ -0,0 +1,40 @@
+import sys
+from contextlib import ExitStack
+from time import monotonic
+
+from django.core.management import BaseCommand
+from foodgram.recipe_transfer import RECIPE_IMPORT_BATCH_SIZE, RecipeImporter
+
+
+class Command(BaseCommand):
+    """
+    Загружаем рецепты из NDJSON, выгруженного export_recipes.
+    Авторы ищутся по почте, ингредиенты — по названию
+    и единице измерения, тэги — по slug. Каждый пакет пишется
+    в отдельной транзакции, строки с ошибками пропускаются.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Файл NDJSON, по умолчанию стандартный ввод')
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPE_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        with ExitStack() as stack:
+            file = sys.stdin if options['path'] == '-' else (
+                stack.enter_context(
+                    open(options['path'], encoding='utf-8')))
+            importer = RecipeImporter(options['batch_size']).run(file)
+        elapsed = monotonic() - started
+        rate = importer.created / elapsed if elapsed else importer.created
+        for error in importer.errors:
+            self.stdout.write(error)
+        self.stdout.write(
+            f'Добавлено: {importer.created}, с ошибками: {importer.failed}; '
+            f'{elapsed:.2f} с ({rate:.0f} рецептов/с)')
+        self.stdout.write(self.style.SUCCESS('Загрузка рецептов завершена'))
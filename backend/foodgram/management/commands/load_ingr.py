@@ -1,18 +1,14 @@
-import json
-
-from django.core.management import BaseCommand
+from foodgram.management.loader import BulkLoadCommand
 from foodgram.models import Ingredient
 
 
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     """
-    Загружаем ингредиенты из файла JSON.
+    Загружаем ингредиенты из файла JSON или CSV.
     """
-
-    def handle(self, *args, **options):
-        with open('data/ingredients.json', encoding='utf-8') as file:
-            data = json.loads(file.read())
-            for ingredient in data:
-                Ingredient.objects.get_or_create(**ingredient)
-        self.stdout.write(self.style.SUCCESS(
-            'Загрузка ингредиентов завершена'))
+    model = Ingredient
+    default_path = 'data/ingredients.json'
+    key_fields = ('name', 'measurement_unit')
+    csv_fields = ('name', 'measurement_unit')
+    recipe_lookup = 'ingredientrecipe__ingredient'
+    success_message = 'Загрузка ингредиентов завершена'
@@ -1,17 +1,15 @@
-import json
-
-from django.core.management import BaseCommand
+from foodgram.management.loader import BulkLoadCommand
 from foodgram.models import Tag
 
 
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     """
-    Загружаем тэги из файла JSON.
+    Загружаем тэги из файла JSON или CSV.
     """
-
-    def handle(self, *args, **options):
-        with open('data/tag.json', encoding='utf-8') as file:
-            data = json.loads(file.read())
-            for tag in data:
-                Tag.objects.get_or_create(**tag)
-        self.stdout.write(self.style.SUCCESS('Загрузка тэгов завершена'))
+    model = Tag
+    default_path = 'data/tag.json'
+    key_fields = ('slug',)
+    update_fields = ('name', 'color')
+    csv_fields = ('name', 'color', 'slug')
+    recipe_lookup = 'tags'
+    success_message = 'Загрузка тэгов завершена'
@@ -0,0 +1,55 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from foodgram.bulk import get_batch_size
+from foodgram.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    """
+    Пересобираем агрегированные списки покупок
+    по содержимому корзин или проверяем их.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить списки покупок, ничего не изменяя')
+
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.objects.expected_totals()
+        if options['verify']:
+            actual = {
+                (user_id, ingredient_id): total
+                for user_id, ingredient_id, total
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'total')
+            }
+            mismatches = {
+                key for key in {*expected, *actual}
+                if expected.get(key) != actual.get(key)
+            }
+            for user_id, ingredient_id in sorted(mismatches):
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'ожидалось {expected.get((user_id, ingredient_id))}, '
+                    f'в таблице {actual.get((user_id, ingredient_id))}')
+            if mismatches:
+                self.stdout.write(self.style.ERROR(
+                    f'Расхождений в списках покупок: {len(mismatches)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    'Списки покупок совпадают с корзинами'))
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            items = [
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, total=total)
+                for (user_id, ingredient_id), total in expected.items()
+            ]
+            ShoppingListItem.objects.bulk_create(
+                items, batch_size=get_batch_size(
+                    ShoppingListItem._meta.concrete_fields, items, 1000))
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {len(expected)} позиций'))
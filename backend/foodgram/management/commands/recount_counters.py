@@ -0,0 +1,45 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from foodgram.counters import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    """
+    Сверяем счетчики популярности рецептов и авторов
+    с таблицами связей и исправляем расхождения.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счетчики, ничего не изменяя')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, link_model, link_field in COUNTERS:
+            actual = actual_count(link_model, link_field)
+            with transaction.atomic():
+                drifted = list(model.objects.annotate(
+                    actual=actual
+                ).exclude(**{field: F('actual')}).values_list(
+                    'pk', field, 'actual'))
+                for pk, value, expected in drifted:
+                    self.stdout.write(
+                        f'{model._meta.verbose_name} {pk}, {field}: '
+                        f'ожидалось {expected}, в таблице {value}')
+                if drifted and not options['verify']:
+                    model.objects.filter(
+                        pk__in=[pk for pk, _, _ in drifted]
+                    ).update(**{field: actual})
+            total += len(drifted)
+        if not total:
+            self.stdout.write(self.style.SUCCESS(
+                'Счетчики совпадают с таблицами связей'))
+        elif options['verify']:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений в счетчиках: {total}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счетчиков: {total}'))
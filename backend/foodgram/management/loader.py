@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from api.cache import CATALOG_VERSION, bump_version
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from foodgram.models import Recipe, TableVersion
+
+READ_CHUNK_SIZE = 64 * 1024
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file):
+    """
+    Поэлементно разбирает JSON-массив объектов,
+    читая файл блоками, а не целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив объектов')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def iter_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+class BulkLoadCommand(BaseCommand):
+    """
+    Базовая команда пакетной загрузки справочника
+    из JSON или CSV. Строки с уже существующим ключом
+    пропускаются или обновляются, новые добавляются
+    через bulk_create в одной транзакции.
+    """
+    model = None
+    default_path = None
+    key_fields = ()
+    update_fields = ()
+    csv_fields = ()
+    recipe_lookup = None
+    success_message = 'Загрузка завершена'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=self.default_path,
+            help='Путь к файлу JSON или CSV')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном запросе')
+
+    def read_rows(self, file, path):
+        if os.path.splitext(path)[1].lower() == '.csv':
+            return iter_csv(file, self.csv_fields)
+        return iter_json_array(file)
+
+    def load_batch(self, batch, existing):
+        """
+        Раскладывает строки пакета на новые, измененные
+        и пропущенные и записывает их двумя запросами.
+        Возвращает число новых строк и id измененных.
+        """
+        fields = (*self.key_fields, *self.update_fields)
+        to_create, to_update = [], []
+        for row in batch:
+            key = tuple(row[field] for field in self.key_fields)
+            values = tuple(row[field] for field in fields)
+            current = existing.get(key)
+            if current is None:
+                to_create.append(self.model(**row))
+                existing[key] = (None, *values)
+            elif current[0] is not None and current[1:] != values:
+                to_update.append(self.model(id=current[0], **row))
+                existing[key] = (current[0], *values)
+        self.model.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_update:
+            self.model.objects.bulk_update(to_update, self.update_fields)
+        return len(to_create), [item.id for item in to_update]
+
+    def touch_recipes(self, updated_ids):
+        """
+        bulk_update не отправляет post_save, поэтому дата
+        изменения рецептов с измененными строками и версия
+        кеша рецептов обновляются здесь, как в сигналах
+        при сохранении одной строки.
+        """
+        if not self.recipe_lookup or not updated_ids:
+            return
+        Recipe.objects.filter(
+            **{f'{self.recipe_lookup}__in': updated_ids}
+        ).update(updated_at=timezone.now())
+        bump_version(CATALOG_VERSION)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        existing = {
+            values[1:len(self.key_fields) + 1]: values
+            for values in self.model.objects.values_list(
+                'id', *self.key_fields, *self.update_fields)
+        }
+        inserted = total = 0
+        updated_ids = []
+        with open(options['path'], encoding='utf-8') as file:
+            rows = self.read_rows(file, options['path'])
+            with transaction.atomic():
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    created, changed = self.load_batch(batch, existing)
+                    inserted += created
+                    updated_ids.extend(changed)
+                    total += len(batch)
+                if inserted or updated_ids:
+                    TableVersion.objects.bump(self.model._meta.db_table)
+                self.touch_recipes(updated_ids)
+        updated = len(updated_ids)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Добавлено: {inserted}, обновлено: {updated}, '
+            f'пропущено: {total - inserted - updated}; '
+            f'{total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)')
+        self.stdout.write(self.style.SUCCESS(self.success_message))
@@ -1,10 +1,16 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from users.models import CountersMixin
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+
 
 class Tag(models.Model):
     """
@@ -55,15 +61,25 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент',
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient')]
+        indexes = [
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_like_idx',
+                opclasses=('varchar_pattern_ops',))]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """
     Модель добавления новых рецептов.
     """
+    counter_fields = ('favorites_count', 'in_carts_count')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -95,6 +111,11 @@ class Recipe(models.Model):
         help_text='Загрузите картинку рецепта',
         upload_to='recipes/'
     )
+    image_variants_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки готовы'
+    )
     text = models.TextField(
         verbose_name='Описание',
         help_text='Введите описание рецепта'
@@ -108,13 +129,43 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
-        auto_now_add=True
+        default=timezone.now,
+        editable=False
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
     )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx')]
 
     def __str__(self):
         return self.name
@@ -149,7 +200,7 @@ class IngredientInRecipe(models.Model):
         ordering = ('id',)
         constraints = [
             models.UniqueConstraint(
-                fields=('ingredient', 'amount'),
+                fields=('recipe', 'ingredient'),
                 name='unique_ingredient_in_recipe')]
 
     def __str__(self):
@@ -175,6 +226,11 @@ class Favorite(models.Model):
         related_name='favorite_recipe',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -183,6 +239,10 @@ class Favorite(models.Model):
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
                 name='unique_favorite')]
+        indexes = [
+            models.Index(
+                fields=('created',),
+                name='favorite_created_idx')]
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в избранное'
@@ -204,6 +264,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart_recipe',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -212,6 +277,298 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
                 name='unique_shopping_cart')]
+        indexes = [
+            models.Index(
+                fields=('created',),
+                name='shopping_cart_created_idx')]
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в корзину покупок'
+
+
+class RecipeTrend(models.Model):
+    """
+    Модель рейтинга популярных рецептов:
+    оценка с затуханием по времени, заранее
+    рассчитанная командой compute_trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Оценка'
+    )
+    computed_at = models.DateTimeField(
+        verbose_name='Дата расчета'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ('-score',)
+        indexes = [
+            models.Index(fields=('-score',), name='recipe_trend_score_idx')]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.3f}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Модель похожих рецептов: ближайшие соседи рецепта
+    по косинусной мере совместных добавлений в избранное
+    и корзину, рассчитанные командой compute_similar_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe')]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx')]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
+
+
+class ShoppingListManager(models.Manager):
+    """
+    Поддерживает агрегированный список покупок
+    в актуальном состоянии при изменении корзины
+    и состава рецептов.
+    """
+
+    @staticmethod
+    def recipe_amounts(*recipe_ids):
+        amounts = {}
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Прибавляет deltas ({ingredient_id: количество})
+        к спискам покупок пользователей user_ids.
+        Вызывать внутри транзакции.
+
+        Недостающие строки сначала вставляются с нулем
+        с пропуском конфликтов: параллельная вставка той же
+        строки дожидается фиксации первой, а не падает
+        на уникальном ограничении. Затем все строки
+        блокируются в порядке (user_id, ingredient_id),
+        поэтому встречные изменения не взаимоблокируются.
+        """
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        ingredient_ids = sorted(deltas)
+        self.bulk_create([
+            self.model(user_id=user_id, ingredient_id=ingredient_id, total=0)
+            for user_id in user_ids
+            for ingredient_id in ingredient_ids
+            if deltas[ingredient_id] > 0
+        ], ignore_conflicts=True)
+        to_update, to_delete = [], []
+        for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).order_by('user_id', 'ingredient_id'):
+            item.total = max(item.total + deltas[item.ingredient_id], 0)
+            if item.total:
+                to_update.append(item)
+            else:
+                to_delete.append(item.id)
+        self.bulk_update(to_update, ('total',))
+        self.filter(id__in=to_delete).delete()
+
+    def add_recipe(self, user, *recipe_ids):
+        if recipe_ids:
+            self.apply_deltas((user.id,), self.recipe_amounts(*recipe_ids))
+
+    def remove_recipe(self, user, *recipe_ids):
+        if recipe_ids:
+            self.apply_deltas((user.id,), {
+                ingredient_id: -amount for ingredient_id, amount
+                in self.recipe_amounts(*recipe_ids).items()})
+
+    def expected_totals(self):
+        """
+        Эталонные значения списка покупок,
+        вычисленные по корзинам с нуля.
+        """
+        return {
+            (row['recipe__shopping_cart_recipe__user'],
+             row['ingredient']): row['total']
+            for row in IngredientInRecipe.objects.filter(
+                recipe__shopping_cart_recipe__isnull=False
+            ).values(
+                'recipe__shopping_cart_recipe__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель агрегированного списка покупок:
+    суммарное количество ингредиента во всех
+    рецептах корзины пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    total = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total}'
+
+
+class VersionBumped:
+    """
+    Отметка в очереди on_commit транзакции о том, что
+    версия таблицы в ней уже увеличена. Откат транзакции
+    или точки сохранения убирает отметку вместе с самим
+    увеличением версии.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __call__(self):
+        pass
+
+
+class TableVersionManager(models.Manager):
+
+    def bump(self, table):
+        """
+        Увеличивает версию таблицы после любого ее изменения.
+        """
+        if not self.filter(table=table).update(
+                version=F('version') + 1, updated_at=timezone.now()):
+            self.get_or_create(table=table)
+
+    def bump_once(self, table):
+        """
+        Увеличивает версию таблицы один раз за транзакцию
+        (точку сохранения): сигналы приходят на каждую
+        строку, а строка версии общая для всех запросов,
+        и повторные UPDATE только держат ее блокировку.
+        Версию читают другие транзакции после фиксации,
+        поэтому одного увеличения достаточно.
+        """
+        connection = connections[self.db]
+        if connection.in_atomic_block:
+            # Блоки atomic(savepoint=False) добавляют None: отдельно
+            # от внешней точки сохранения они не откатываются.
+            current = set(connection.savepoint_ids) - {None}
+            if any(isinstance(hook, VersionBumped) and hook.table == table
+                   and savepoint_ids - {None} == current
+                   for savepoint_ids, hook in connection.run_on_commit):
+                return
+            transaction.on_commit(VersionBumped(table), using=self.db)
+        self.bump(table)
+
+    def get_version(self, table):
+        return self.filter(table=table).values_list(
+            'version', 'updated_at').first() or (0, None)
+
+    def get_versions(self, tables):
+        """
+        Версии нескольких таблиц одним запросом
+        в порядке tables.
+        """
+        found = {
+            table: (version, updated_at)
+            for table, version, updated_at in self.filter(
+                table__in=tables).values_list(
+                    'table', 'version', 'updated_at')
+        }
+        return [found.get(table, (0, None)) for table in tables]
+
+    @staticmethod
+    def user_key(user_id):
+        """
+        Версия отметок пользователя: избранного,
+        корзины и подписок.
+        """
+        return f'user:{user_id}'
+
+
+class TableVersion(models.Model):
+    """
+    Модель версий таблиц для условных GET-запросов:
+    версия растет при каждом изменении соответствующей
+    таблицы или отметок пользователя.
+    """
+    table = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Таблица'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    objects = TableVersionManager()
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+
+    def __str__(self):
+        return f'{self.table}: {self.version}'
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import IngredientInRecipe, Recipe
+
+RECIPE_MATCH_TTL = getattr(settings, 'RECIPE_MATCH_TTL', 3600)
+RECIPE_MATCH_SYNC_INTERVAL = getattr(
+    settings, 'RECIPE_MATCH_SYNC_INTERVAL', 5)
+RECIPE_MATCH_MAX_MISSING = getattr(settings, 'RECIPE_MATCH_MAX_MISSING', 3)
+# Запас на транзакции, зафиксированные позже
+# записанной в них даты изменения рецепта.
+RECIPE_MATCH_SYNC_LAG = timedelta(seconds=60)
+
+
+def to_bitset(slots, size):
+    """
+    Собирает битовое множество из номеров позиций.
+    """
+    buffer = bytearray((size + 7) // 8)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bitset):
+    """
+    Перебирает номера установленных битов по возрастанию.
+    """
+    bits = bin(bitset)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class RecipeMatchIndex:
+    """
+    Инвертированный индекс в памяти процесса: каждому рецепту
+    отведен бит, каждому ингредиенту — битовое множество его
+    рецептов, а число ингредиентов рецепта хранится по битам
+    в отдельных множествах. Подбор складывает множества
+    ингредиентов запроса поразрядно и сравнивает сумму с
+    числом ингредиентов рецептов сразу для всех рецептов.
+
+    Рецепты, измененные в этом процессе, обновляются по
+    сигналам, измененные в других — по дате изменения
+    не реже раза в sync_interval секунд. Удаления в других
+    процессах учитываются полной перестройкой по истечении TTL.
+    """
+
+    def __init__(self, ttl=RECIPE_MATCH_TTL,
+                 sync_interval=RECIPE_MATCH_SYNC_INTERVAL):
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = set()
+        self._loaded_at = 0
+        self._checked_at = 0
+        self._synced_at = None
+        self._reset()
+
+    def _reset(self):
+        self._slots = {}
+        self._recipe_ids = []
+        self._ingredients = {}
+        self._bitsets = {}
+        self._size_bits = []
+        self._full = 0
+
+    def invalidate_recipe(self, recipe_id):
+        with self._lock:
+            self._dirty.add(recipe_id)
+
+    def build(self, rows):
+        """
+        Строит индекс по парам (id рецепта, id ингредиента).
+        """
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id].add(ingredient_id)
+        self._reset()
+        postings = defaultdict(list)
+        sizes = defaultdict(list)
+        for slot, recipe_id in enumerate(sorted(recipes)):
+            ingredient_ids = frozenset(recipes[recipe_id])
+            self._slots[recipe_id] = slot
+            self._recipe_ids.append(recipe_id)
+            self._ingredients[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].append(slot)
+            for bit in range(len(ingredient_ids).bit_length()):
+                if len(ingredient_ids) >> bit & 1:
+                    sizes[bit].append(slot)
+        count = len(self._recipe_ids)
+        self._full = (1 << count) - 1
+        self._bitsets = {
+            ingredient_id: to_bitset(slots, count)
+            for ingredient_id, slots in postings.items()
+        }
+        self._size_bits = [
+            to_bitset(sizes[bit], count)
+            for bit in range(max(sizes, default=-1) + 1)
+        ]
+        self._dirty = set()
+        self._loaded = True
+        self._loaded_at = self._checked_at = time.monotonic()
+
+    def _load(self):
+        synced_at = timezone.now()
+        self.build(IngredientInRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id').order_by().iterator())
+        self._synced_at = synced_at
+
+    def _set_recipe(self, recipe_id, ingredient_ids):
+        old = self._ingredients.pop(recipe_id, frozenset())
+        slot = self._slots.get(recipe_id)
+        if slot is None:
+            if not ingredient_ids:
+                return
+            slot = len(self._recipe_ids)
+            self._slots[recipe_id] = slot
+            self._recipe_ids.append(recipe_id)
+            self._full = (1 << len(self._recipe_ids)) - 1
+        bit = 1 << slot
+        for ingredient_id in old - ingredient_ids:
+            self._bitsets[ingredient_id] &= ~bit
+        for ingredient_id in ingredient_ids - old:
+            self._bitsets[ingredient_id] = (
+                self._bitsets.get(ingredient_id, 0) | bit)
+        size = len(ingredient_ids)
+        while len(self._size_bits) < size.bit_length():
+            self._size_bits.append(0)
+        for position, bitset in enumerate(self._size_bits):
+            if size >> position & 1:
+                self._size_bits[position] = bitset | bit
+            else:
+                self._size_bits[position] = bitset & ~bit
+        if ingredient_ids:
+            self._ingredients[recipe_id] = frozenset(ingredient_ids)
+
+    def _refresh(self, recipe_ids):
+        recipes = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id').order_by():
+            recipes[recipe_id].add(ingredient_id)
+        for recipe_id, ingredient_ids in recipes.items():
+            self._set_recipe(recipe_id, frozenset(ingredient_ids))
+
+    def _sync(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._loaded_at >= self.ttl:
+            self._load()
+            return
+        if (self._synced_at is not None
+                and now - self._checked_at >= self.sync_interval):
+            synced_at = timezone.now()
+            self._dirty.update(Recipe.objects.filter(
+                updated_at__gte=self._synced_at - RECIPE_MATCH_SYNC_LAG
+            ).values_list('id', flat=True))
+            self._synced_at = synced_at
+            self._checked_at = now
+        if self._dirty:
+            self._refresh(list(self._dirty))
+            self._dirty = set()
+
+    def _covered(self, bitsets, max_missing):
+        """
+        Битовое множество рецептов, где число совпавших
+        ингредиентов плюс max_missing не меньше числа
+        всех ингредиентов рецепта.
+        """
+        full = self._full
+        counts = []
+        for bitset in bitsets:
+            carry = bitset
+            for position, count in enumerate(counts):
+                counts[position], carry = count ^ carry, count & carry
+                if not carry:
+                    break
+            if carry:
+                counts.append(carry)
+        total, carry = [], 0
+        width = max(len(counts), max_missing.bit_length())
+        for position in range(width):
+            a = counts[position] if position < len(counts) else 0
+            b = full if max_missing >> position & 1 else 0
+            total.append(a ^ b ^ carry)
+            carry = (a & b) | (carry & (a ^ b))
+        total.append(carry)
+        borrow = 0
+        for position in range(max(len(total), len(self._size_bits))):
+            a = total[position] if position < len(total) else 0
+            b = (self._size_bits[position]
+                 if position < len(self._size_bits) else 0)
+            borrow = ((full ^ a) & b) | ((full ^ (a ^ b)) & borrow)
+        return full ^ borrow
+
+    def search(self, ingredient_ids, max_missing=None):
+        """
+        Возвращает (id рецепта, есть ингредиентов,
+        не хватает ингредиентов) для рецептов, где есть
+        хотя бы один из ingredient_ids и не хватает не более
+        max_missing: сначала те, где не хватает меньше,
+        затем с большим совпадением.
+        """
+        if max_missing is None:
+            max_missing = RECIPE_MATCH_MAX_MISSING
+        query = frozenset(ingredient_ids)
+        with self._lock:
+            self._sync()
+            bitsets = [
+                self._bitsets[ingredient_id] for ingredient_id in query
+                if ingredient_id in self._bitsets
+            ]
+            matched = 0
+            for bitset in bitsets:
+                matched |= bitset
+            candidates = matched & self._covered(bitsets, max_missing)
+            found = []
+            for slot in iter_bits(candidates):
+                recipe_id = self._recipe_ids[slot]
+                ingredients = self._ingredients[recipe_id]
+                have = len(ingredients & query)
+                found.append((len(ingredients) - have, -have, -recipe_id))
+        found.sort()
+        return [
+            (-recipe_id, -have, missing)
+            for missing, have, recipe_id in found
+        ]
+
+
+recipe_match_index = RecipeMatchIndex()
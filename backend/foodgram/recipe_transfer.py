@@ -0,0 +1,242 @@
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from users.models import User
+
+from .bulk import bulk_create_with_ids, insert_rows
+from .counters import change_counters
+from .models import Ingredient, IngredientInRecipe, Recipe, TableVersion, Tag
+
+RECIPE_EXPORT_CHUNK_SIZE = getattr(settings, 'RECIPE_EXPORT_CHUNK_SIZE', 2000)
+RECIPE_IMPORT_BATCH_SIZE = getattr(settings, 'RECIPE_IMPORT_BATCH_SIZE', 1000)
+RECIPE_IMPORT_MAX_ERRORS = 100
+SMALL_INTEGER_MAX = 32767
+
+
+def iter_recipe_records(queryset=None, chunk_size=RECIPE_EXPORT_CHUNK_SIZE):
+    """
+    Рецепты с тэгами, ингредиентами и ссылкой на картинку.
+    Рецепты читаются курсором iterator(), связи — двумя
+    запросами на пакет, поэтому расход памяти не зависит
+    от числа рецептов.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    rows = queryset.order_by('id').values_list(
+        'id', 'author__email', 'name', 'text', 'cooking_time', 'image',
+        'image_variants_ready', 'pub_date').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        recipe_ids = [row[0] for row in chunk]
+        tags = defaultdict(list)
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+        ).order_by('id').values_list('recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        ingredients = defaultdict(list)
+        for recipe_id, name, unit, amount in (
+                IngredientInRecipe.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).order_by('id').values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount')):
+            ingredients[recipe_id].append({
+                'name': name, 'measurement_unit': unit, 'amount': amount})
+        for (recipe_id, author, name, text, cooking_time, image,
+             image_variants_ready, pub_date) in chunk:
+            yield {
+                'id': recipe_id,
+                'author': author,
+                'name': name,
+                'text': text,
+                'cooking_time': cooking_time,
+                'image': image or None,
+                'image_variants_ready': image_variants_ready,
+                'pub_date': pub_date.isoformat(),
+                'tags': tags[recipe_id],
+                'ingredients': ingredients[recipe_id],
+            }
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class RecipeImporter:
+    """
+    Загрузка рецептов из строк NDJSON в формате
+    iter_recipe_records. Ингредиенты и тэги сопоставляются
+    по словарям в памяти, авторы — одним запросом на пакет,
+    каждый пакет пишется в своей транзакции через bulk_create.
+    Рецепты всегда создаются заново, id из файла
+    не используется. Строки с ошибками пропускаются.
+    """
+
+    def __init__(self, batch_size=RECIPE_IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < RECIPE_IMPORT_MAX_ERRORS:
+            self.errors.append(f'Строка {number}: {message}')
+
+    def run(self, lines):
+        numbered = (
+            (number, line) for number, line in enumerate(lines, 1)
+            if line.strip())
+        while True:
+            batch = []
+            for number, line in islice(numbered, self.batch_size):
+                try:
+                    batch.append((number, self.parse(line)))
+                except ValueError as error:
+                    self.error(number, error)
+            if not batch:
+                return self
+            self.write(batch)
+
+    def parse(self, line):
+        """
+        Проверяет запись и заменяет тэги и ингредиенты на id.
+        """
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError('некорректный JSON')
+        if not isinstance(record, dict):
+            raise ValueError('ожидается объект JSON')
+        author = record.get('author')
+        if author is not None and not isinstance(author, str):
+            raise ValueError('автор указывается адресом почты')
+        name, text = record.get('name'), record.get('text')
+        if not isinstance(name, str) or not 0 < len(name) <= 200:
+            raise ValueError('название от 1 до 200 символов обязательно')
+        if not isinstance(text, str) or not text:
+            raise ValueError('отсутствует описание')
+        cooking_time = record.get('cooking_time')
+        if (not isinstance(cooking_time, int)
+                or not 0 < cooking_time <= SMALL_INTEGER_MAX):
+            raise ValueError('время приготовления не меньше минуты')
+        image = record.get('image') or None
+        if image is not None and not isinstance(image, str):
+            raise ValueError('картинка указывается путем к файлу')
+        tag_ids = self.parse_tags(record.get('tags'))
+        amounts = self.parse_ingredients(record.get('ingredients'))
+        pub_date = self.parse_pub_date(record.get('pub_date'))
+        return {
+            'author': author,
+            'name': name,
+            'text': text,
+            'cooking_time': cooking_time,
+            'image': image,
+            'image_variants_ready': bool(
+                image and record.get('image_variants_ready')),
+            'pub_date': pub_date,
+            'tag_ids': tag_ids,
+            'amounts': amounts,
+        }
+
+    def parse_tags(self, slugs):
+        try:
+            tag_ids = list(dict.fromkeys(
+                self.tags[slug] for slug in slugs or []))
+        except (KeyError, TypeError):
+            raise ValueError('указанный тэг отсутствует в базе данных')
+        if not tag_ids:
+            raise ValueError('отсутствует тэг')
+        return tag_ids
+
+    def parse_ingredients(self, items):
+        amounts = {}
+        for item in items or []:
+            try:
+                ingredient_id = self.ingredients[
+                    item['name'], item['measurement_unit']]
+                amount = item['amount']
+            except (KeyError, TypeError):
+                raise ValueError('ингредиент отсутствует в базе данных')
+            if ingredient_id in amounts:
+                raise ValueError(
+                    'ингредиенты в рецепте не должны повторяться')
+            if (not isinstance(amount, int)
+                    or not 0 < amount <= SMALL_INTEGER_MAX):
+                raise ValueError('некорректное количество ингредиента')
+            amounts[ingredient_id] = amount
+        if not amounts:
+            raise ValueError('отсутствуют ингредиенты')
+        return amounts
+
+    @staticmethod
+    def parse_pub_date(value):
+        if value is None:
+            return None
+        pub_date = parse_datetime(str(value))
+        if pub_date is None:
+            raise ValueError('некорректная дата публикации')
+        if timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        return pub_date
+
+    def write(self, batch):
+        emails = {record['author'] for _, record in batch} - {None}
+        authors = dict(User.objects.filter(
+            email__in=emails).values_list('email', 'id'))
+        records = []
+        for number, record in batch:
+            if record['author'] is not None and (
+                    record['author'] not in authors):
+                self.error(
+                    number, f'автор {record["author"]} не найден')
+            else:
+                records.append(record)
+        if not records:
+            return
+        now = timezone.now()
+        recipes = [
+            Recipe(
+                author_id=authors.get(record['author']),
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+                image_variants_ready=record['image_variants_ready'],
+                pub_date=record['pub_date'] or now)
+            for record in records
+        ]
+        with transaction.atomic():
+            bulk_create_with_ids(Recipe, recipes)
+            insert_rows(Recipe.tags.through, ('recipe', 'tag'), [
+                (recipe.id, tag_id)
+                for recipe, record in zip(recipes, records)
+                for tag_id in record['tag_ids']
+            ])
+            insert_rows(
+                IngredientInRecipe, ('recipe', 'ingredient', 'amount'), [
+                    (recipe.id, ingredient_id, amount)
+                    for recipe, record in zip(recipes, records)
+                    for ingredient_id, amount in record['amounts'].items()
+                ])
+            change_counters(
+                User, 'recipes_count',
+                [recipe.author_id for recipe in recipes], 1)
+            TableVersion.objects.bump(Recipe._meta.db_table)
+        self.created += len(recipes)
@@ -0,0 +1,91 @@
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Favorite, ShoppingCart, SimilarRecipe
+
+SIMILAR_RECIPES_TOP = getattr(settings, 'SIMILAR_RECIPES_TOP', 20)
+# Самые активные пользователи вносят в расчет не больше
+# стольких рецептов: время и память растут как квадрат
+# числа рецептов пользователя.
+SIMILAR_MAX_USER_ITEMS = getattr(settings, 'SIMILAR_MAX_USER_ITEMS', 500)
+SIMILAR_BATCH_SIZE = 1000
+
+
+def iter_interactions():
+    """
+    Пары (пользователь, рецепт) из избранного и корзин
+    без повторов, упорядоченные по пользователю.
+    """
+    return Favorite.objects.values_list('user_id', 'recipe_id').union(
+        ShoppingCart.objects.values_list('user_id', 'recipe_id')
+    ).order_by('user_id', '-recipe_id').iterator()
+
+
+class InteractionMatrix:
+    """
+    Бинарная матрица пользователь × рецепт, хранимая
+    плотными массивами: строки (рецепты пользователя)
+    подряд в items со смещениями offsets, столбцы
+    (пользователи рецепта) — в users. Памяти нужно
+    около 16 байт на взаимодействие.
+    """
+
+    def __init__(self, interactions, max_user_items=SIMILAR_MAX_USER_ITEMS):
+        self.items = array('l')
+        self.offsets = array('l', [0])
+        self.users = defaultdict(lambda: array('l'))
+        for user, rows in groupby(interactions, key=itemgetter(0)):
+            user_index = len(self.offsets) - 1
+            for _, recipe_id in rows:
+                if len(self.items) - self.offsets[-1] >= max_user_items:
+                    continue
+                self.items.append(recipe_id)
+                self.users[recipe_id].append(user_index)
+            self.offsets.append(len(self.items))
+
+    def neighbors(self, recipe_id, top=SIMILAR_RECIPES_TOP, min_common=1):
+        """
+        Лучшие top рецептов по косинусной мере: число общих
+        пользователей, деленное на корень из произведения
+        числа пользователей каждого рецепта.
+        """
+        users = self.users[recipe_id]
+        common = Counter()
+        for user_index in users:
+            common.update(self.items[
+                self.offsets[user_index]:self.offsets[user_index + 1]])
+        del common[recipe_id]
+        return heapq.nlargest(top, (
+            (count / math.sqrt(len(users) * len(self.users[other])), other)
+            for other, count in common.items() if count >= min_common))
+
+
+def rebuild_similar_recipes(top=SIMILAR_RECIPES_TOP, min_common=1,
+                            max_user_items=SIMILAR_MAX_USER_ITEMS):
+    """
+    Пересчитывает таблицу похожих рецептов целиком
+    и возвращает число сохраненных пар.
+    """
+    matrix = InteractionMatrix(iter_interactions(), max_user_items)
+    stored, batch = 0, []
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for recipe_id in list(matrix.users):
+            for score, similar_id in matrix.neighbors(
+                    recipe_id, top, min_common):
+                batch.append(SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score))
+            if len(batch) >= SIMILAR_BATCH_SIZE:
+                SimilarRecipe.objects.bulk_create(batch)
+                stored += len(batch)
+                batch = []
+        SimilarRecipe.objects.bulk_create(batch)
+        stored += len(batch)
+    return stored
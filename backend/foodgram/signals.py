@@ -0,0 +1,240 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import Subscribe
+
+from .counters import change_link_counters
+from .images import delete_image_variants
+from .ingredient_index import ingredient_index
+from .models import (SEARCH_CONFIG, Favorite, Ingredient, IngredientInRecipe,
+                     Recipe, ShoppingCart, ShoppingListItem, TableVersion,
+                     Tag)
+from .recipe_match import recipe_match_index
+
+User = get_user_model()
+
+RECIPE_SEARCH_SQL = f"""
+CREATE OR REPLACE FUNCTION foodgram_recipe_search_vector()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A')
+        || setweight(
+            to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS foodgram_recipe_search_vector_update
+    ON foodgram_recipe;
+CREATE TRIGGER foodgram_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text, search_vector
+    ON foodgram_recipe
+    FOR EACH ROW EXECUTE PROCEDURE foodgram_recipe_search_vector();
+
+CREATE INDEX IF NOT EXISTS foodgram_recipe_search_vector_gin
+    ON foodgram_recipe USING gin (search_vector);
+
+UPDATE foodgram_recipe SET search_vector = NULL
+    WHERE search_vector IS NULL;
+"""
+
+INGREDIENT_TRIGRAM_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS foodgram_ingredient_name_trgm
+    ON foodgram_ingredient USING gin (upper(name::text) gin_trgm_ops);
+"""
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_match(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(recipe_match_index.invalidate_recipe, instance.id))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(
+            partial(delete_image_variants, instance.image.name))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients_match(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(recipe_match_index.invalidate_recipe, instance.recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_table_version(sender, **kwargs):
+    TableVersion.objects.bump_once(sender._meta.db_table)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def bump_recipe_version(sender, **kwargs):
+    """
+    Версия таблицы рецептов покрывает и их состав,
+    тэги и данные авторов: по ней строится ETag выдачи.
+    """
+    TableVersion.objects.bump_once(Recipe._meta.db_table)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, action, **kwargs):
+    if action.startswith('post_'):
+        TableVersion.objects.bump_once(Recipe._meta.db_table)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscribe)
+def bump_user_version(sender, instance, **kwargs):
+    TableVersion.objects.bump_once(
+        TableVersion.objects.user_key(instance.user_id))
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            ingredientrecipe__ingredient=instance
+        ).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields=None,
+                         **kwargs):
+    """
+    Данные автора входят в выдачу рецепта, поэтому
+    изменение профиля обновляет дату изменения
+    его рецептов. Обновление last_login пропускается.
+    """
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    if Recipe.objects.filter(
+            author=instance).update(updated_at=timezone.now()):
+        TableVersion.objects.bump_once(Recipe._meta.db_table)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    """
+    Счетчики популярности меняются в той же транзакции,
+    что и вставка или удаление строки связи.
+    """
+    if created and not raw:
+        change_link_counters(sender, (instance,), 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+def decrement_counters(sender, instance, **kwargs):
+    change_link_counters(sender, (instance,), -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, raw=False, **kwargs):
+    """
+    Список покупок меняется при любом изменении корзины:
+    через API, админку или каскадное удаление. Массовые
+    вставки и удаления без сигналов обновляют его явно,
+    а rebuild_shopping_list восстанавливает после
+    изменений в обход ORM.
+    """
+    if created and not raw:
+        ShoppingListItem.objects.apply_deltas(
+            (instance.user_id,),
+            ShoppingListItem.objects.recipe_amounts(instance.recipe_id))
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    ShoppingListItem.objects.apply_deltas(
+        (instance.user_id,),
+        {ingredient_id: -amount for ingredient_id, amount
+         in ShoppingListItem.objects.recipe_amounts(
+             instance.recipe_id).items()})
+
+
+def change_shopping_lists(recipe_id, ingredient_id, delta):
+    """
+    Изменяет количество ингредиента в списках покупок
+    всех пользователей, у которых рецепт в корзине.
+    При каскадном удалении рецепта порядок не важен:
+    удаленная раньше строка корзины или ингредиента
+    уже не попадает во второй запрос.
+    """
+    ShoppingListItem.objects.apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True),
+        {ingredient_id: delta})
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_recipe_ingredient(sender, instance, raw=False, **kwargs):
+    instance._saved_amount = None
+    if instance.pk is not None and not raw:
+        instance._saved_amount = sender.objects.filter(
+            pk=instance.pk).values_list(
+                'recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def update_shopping_lists(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    saved = getattr(instance, '_saved_amount', None)
+    current = (instance.recipe_id, instance.ingredient_id, instance.amount)
+    if saved == current:
+        return
+    if saved is not None:
+        recipe_id, ingredient_id, amount = saved
+        change_shopping_lists(recipe_id, ingredient_id, -amount)
+    change_shopping_lists(*current)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def reduce_shopping_lists(sender, instance, **kwargs):
+    change_shopping_lists(
+        instance.recipe_id, instance.ingredient_id, -instance.amount)
+
+
+@receiver(post_migrate)
+def create_postgres_search_objects(sender, using, **kwargs):
+    """
+    На PostgreSQL поисковый вектор рецепта поддерживается
+    триггером и индексируется GIN-индексом, а поиск
+    ингредиентов по подстроке без учета регистра
+    обслуживает триграммный индекс.
+    """
+    connection = connections[using]
+    if sender.name != 'foodgram' or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(RECIPE_SEARCH_SQL)
+        cursor.execute(INGREDIENT_TRIGRAM_SQL)
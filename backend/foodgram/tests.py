@@ -0,0 +1,335 @@
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from users.models import User
+
+from .bulk import bulk_create_with_ids
+from .images import RECIPE_IMAGE_VARIANTS, delete_image_variants, variant_name
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     RecipeTrend, ShoppingCart, ShoppingListItem, TableVersion,
+                     Tag)
+from .recipe_transfer import RecipeImporter
+from .trending import TRENDING_SIZE, rebuild_trending
+
+
+class ShoppingListSignalsTest(TestCase):
+    """
+    Список покупок совпадает с пересчетом по корзинам
+    при изменениях не только через API, но и через
+    ORM (админку) и каскадные удаления.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        cls.users = [
+            User.objects.create_user(
+                email=f'buyer{number}@foodgram.ru',
+                username=f'buyer{number}', first_name='Иван',
+                last_name='Иванов', password='Pass12345!')
+            for number in range(2)
+        ]
+        cls.flour, cls.milk, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль'))
+
+    def create_recipe(self, **amounts):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Блины', text='Описание',
+            cooking_time=10)
+        for name, amount in amounts.items():
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=getattr(self, name),
+                amount=amount)
+        return recipe
+
+    def check_shopping_list(self):
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total')
+        }
+        self.assertEqual(actual, ShoppingListItem.objects.expected_totals())
+        return actual
+
+    def fill_carts(self):
+        first = self.create_recipe(flour=200, milk=500)
+        second = self.create_recipe(flour=100, salt=5)
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=first)
+        ShoppingCart.objects.create(user=self.users[0], recipe=second)
+        actual = self.check_shopping_list()
+        self.assertEqual(actual[(self.users[0].id, self.flour.id)], 300)
+        return first, second
+
+    def test_cart_rows(self):
+        first, second = self.fill_carts()
+        ShoppingCart.objects.filter(recipe=first).delete()
+        actual = self.check_shopping_list()
+        self.assertEqual(actual, {
+            (self.users[0].id, self.flour.id): 100,
+            (self.users[0].id, self.salt.id): 5,
+        })
+
+    def test_recipe_ingredients(self):
+        first, second = self.fill_carts()
+        row = first.ingredientrecipe.get(ingredient=self.flour)
+        row.amount = 250
+        row.save()
+        self.check_shopping_list()
+        row.ingredient = self.salt
+        row.save()
+        self.check_shopping_list()
+        first.ingredientrecipe.filter(ingredient=self.milk).delete()
+        IngredientInRecipe.objects.create(
+            recipe=second, ingredient=self.milk, amount=50)
+        self.check_shopping_list()
+
+    def test_cascade_deletes(self):
+        first, second = self.fill_carts()
+        first.delete()
+        self.check_shopping_list()
+        Ingredient.objects.filter(id=self.salt.id).delete()
+        self.check_shopping_list()
+        User.objects.filter(id=self.users[0].id).delete()
+        self.check_shopping_list()
+        User.objects.filter(id=self.author.id).delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_api_recipe_update(self):
+        first, second = self.fill_carts()
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(f'/api/recipes/{first.id}/', {
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 150},
+                {'id': self.salt.id, 'amount': 10},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        actual = self.check_shopping_list()
+        self.assertNotIn((self.users[1].id, self.milk.id), actual)
+        self.assertEqual(actual[(self.users[0].id, self.salt.id)], 15)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'SQLite не допускает параллельных транзакций записи')
+class ShoppingListConcurrencyTest(TransactionTestCase):
+    """
+    Параллельные изменения одних и тех же строк списка
+    покупок в разном порядке пользователей не падают
+    на уникальном ограничении и не взаимоблокируются.
+    """
+
+    THREADS = 4
+
+    def test_parallel_deltas(self):
+        users = [
+            User.objects.create_user(
+                email=f'buyer{number}@foodgram.ru',
+                username=f'buyer{number}', first_name='Иван',
+                last_name='Иванов', password='Pass12345!')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко')]
+        deltas = {ingredient.id: 10 for ingredient in ingredients}
+        user_ids = [user.id for user in users]
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def apply(number):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    ShoppingListItem.objects.apply_deltas(
+                        user_ids[::-1] if number % 2 else user_ids, deltas)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=apply, args=(number,))
+            for number in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list('total', flat=True)),
+            {10 * self.THREADS})
+        self.assertEqual(
+            ShoppingListItem.objects.count(), len(users) * len(ingredients))
+
+
+class TableVersionTest(TestCase):
+    """
+    Версия таблицы рецептов растет один раз за транзакцию,
+    сколько бы строк в ней ни изменилось.
+    """
+
+    def test_bump_once_per_transaction(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль')]
+        table = Recipe._meta.db_table
+        version = TableVersion.objects.get_version(table)[0]
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=author, name='Блины', text='Описание',
+                cooking_time=10)
+            for ingredient in ingredients:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=100)
+            recipe.save()
+        self.assertEqual(
+            TableVersion.objects.get_version(table)[0], version + 1)
+        with transaction.atomic():
+            recipe.delete()
+        self.assertEqual(
+            TableVersion.objects.get_version(table)[0], version + 2)
+
+
+class ImageVariantsTest(TestCase):
+    """
+    Варианты картинки удаляются, только когда она
+    больше не принадлежит ни одному рецепту.
+    """
+
+    def test_delete_unused_variants(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        image = 'recipes/images/pancakes.png'
+        recipes = [
+            Recipe.objects.create(
+                author=author, name='Блины', text='Описание',
+                cooking_time=10, image=image)
+            for number in range(2)]
+        names = [variant_name(image, variant)
+                 for variant in RECIPE_IMAGE_VARIANTS]
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(MEDIA_ROOT=directory):
+                for name in names:
+                    default_storage.save(name, ContentFile(b'webp'))
+                Recipe.objects.filter(id=recipes[0].id).delete()
+                delete_image_variants(image)
+                self.assertTrue(all(map(default_storage.exists, names)))
+                Recipe.objects.filter(id=recipes[1].id).delete()
+                delete_image_variants(image)
+                self.assertFalse(any(map(default_storage.exists, names)))
+
+
+class LoadTagTest(TestCase):
+    """
+    Переименование тэга загрузчиком обновляет дату
+    изменения его рецептов, как и сохранение тэга.
+    """
+
+    def load_tags(self, tags):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tags.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(tags, file, ensure_ascii=False)
+            call_command('load_tag', path, stdout=io.StringIO())
+
+    def test_rename_touches_recipes(self):
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        recipe = Recipe.objects.create(
+            author=author, name='Блины', text='Описание', cooking_time=10)
+        recipe.tags.add(tag)
+        other = Recipe.objects.create(
+            author=author, name='Суп', text='Описание', cooking_time=30)
+        touched = Recipe.objects.get(id=recipe.id).updated_at
+        untouched = Recipe.objects.get(id=other.id).updated_at
+        version = TableVersion.objects.get_version(Tag._meta.db_table)[0]
+        self.load_tags([
+            {'name': 'Утро', 'color': '#E26C2D', 'slug': 'breakfast'}])
+        self.assertEqual(Tag.objects.get(id=tag.id).name, 'Утро')
+        self.assertGreater(
+            Recipe.objects.get(id=recipe.id).updated_at, touched)
+        self.assertEqual(
+            Recipe.objects.get(id=other.id).updated_at, untouched)
+        self.assertGreater(
+            TableVersion.objects.get_version(Tag._meta.db_table)[0], version)
+
+
+class RebuildTrendingTest(TestCase):
+    """
+    Рейтинг больше одной допустимой для базы вставки
+    записывается пакетами.
+    """
+
+    def test_rebuild_many_recipes(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'),
+                                ('dinner', '#49B64E'))]
+        count = TRENDING_SIZE + 100
+        recipe_ids = bulk_create_with_ids(Recipe, [
+            Recipe(author=author, name=f'Рецепт {number}',
+                   text='Описание', cooking_time=10)
+            for number in range(count)])
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag=tags[number % 2])
+            for number, recipe_id in enumerate(recipe_ids))
+        Favorite.objects.bulk_create(
+            Favorite(user=author, recipe_id=recipe_id)
+            for recipe_id in recipe_ids)
+        self.assertEqual(rebuild_trending(), count)
+        self.assertEqual(RecipeTrend.objects.count(), count)
+
+
+class RecipeImporterTest(TestCase):
+    """
+    Ошибки в отдельных строках NDJSON пропускают
+    строку, а не прерывают загрузку.
+    """
+
+    def test_invalid_author_is_line_error(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Петр', last_name='Петров', password='Pass12345!')
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+        record = {
+            'name': 'Блины', 'text': 'Описание', 'cooking_time': 10,
+            'tags': ['breakfast'],
+            'ingredients': [
+                {'name': 'мука', 'measurement_unit': 'г', 'amount': 200}],
+        }
+        lines = [
+            json.dumps(dict(record, author=value), ensure_ascii=False)
+            for value in (['author@foodgram.ru'], {'email': 'x'},
+                          author.email)]
+        importer = RecipeImporter().run(lines)
+        self.assertEqual((importer.created, importer.failed), (1, 2))
+        self.assertTrue(all(
+            'автор' in error for error in importer.errors), importer.errors)
+        self.assertEqual(Recipe.objects.get().author, author)
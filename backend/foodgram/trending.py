@@ -0,0 +1,77 @@
+import heapq
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import get_batch_size
+from .models import Favorite, Recipe, RecipeTrend, ShoppingCart, TableVersion
+
+TRENDING_HALF_LIFE_HOURS = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 72)
+TRENDING_SIZE = getattr(settings, 'TRENDING_SIZE', 500)
+# Вклад одного события каждого вида в оценку рецепта.
+TRENDING_WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 2.0),
+)
+# События старше этого числа периодов полураспада
+# дают меньше 0,1% вклада и не учитываются.
+TRENDING_WINDOW_HALF_LIVES = 10
+
+
+def compute_scores(now):
+    """
+    Оценка рецепта — сумма весов событий избранного
+    и корзины, затухающих экспоненциально с возрастом.
+    """
+    half_life = timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+    decay = math.log(2) / half_life.total_seconds()
+    since = now - half_life * TRENDING_WINDOW_HALF_LIVES
+    scores = defaultdict(float)
+    for model, weight in TRENDING_WEIGHTS:
+        events = model.objects.filter(
+            created__gte=since
+        ).values_list('recipe_id', 'created').order_by()
+        for recipe_id, created in events.iterator():
+            age = max((now - created).total_seconds(), 0)
+            scores[recipe_id] += weight * math.exp(-decay * age)
+    return scores
+
+
+def select_trending(scores, size=TRENDING_SIZE):
+    """
+    Оставляет лучшие size рецептов в целом и по каждому
+    тэгу, чтобы выдача с фильтром по тэгу не пустела.
+    """
+    selected = set(heapq.nlargest(size, scores, key=scores.get))
+    by_tag = defaultdict(list)
+    links = Recipe.tags.through.objects.values_list('tag_id', 'recipe_id')
+    for tag_id, recipe_id in links.iterator():
+        if recipe_id in scores:
+            by_tag[tag_id].append(recipe_id)
+    for recipe_ids in by_tag.values():
+        selected.update(heapq.nlargest(size, recipe_ids, key=scores.get))
+    return selected
+
+
+def rebuild_trending(now=None):
+    """
+    Пересчитывает таблицу популярных рецептов целиком.
+    """
+    now = now or timezone.now()
+    scores = compute_scores(now)
+    selected = select_trending(scores)
+    trends = [
+        RecipeTrend(
+            recipe_id=recipe_id, score=scores[recipe_id], computed_at=now)
+        for recipe_id in selected
+    ]
+    with transaction.atomic():
+        RecipeTrend.objects.all().delete()
+        RecipeTrend.objects.bulk_create(trends, batch_size=get_batch_size(
+            RecipeTrend._meta.concrete_fields, trends, 1000))
+        TableVersion.objects.bump(RecipeTrend._meta.db_table)
+    return len(selected)
@@ -11,7 +11,8 @@ class UserAdmin(UserAdmin):
     пользователей в зоне администратора.
     """
     list_display = ('username', 'id', 'first_name',
-                    'last_name', 'email')
+                    'last_name', 'email', 'recipes_count',
+                    'subscribers_count')
     list_filter = ('email', 'first_name')
     empty_value_display = '-пусто-'
 